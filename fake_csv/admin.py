@@ -1,3 +1,57 @@
 from django.contrib import admin
+from django.utils.html import format_html, format_html_join
 
-# Register your models here.
+from .models import DataSet
+
+
+def _per_row(seconds, rows):
+    return f"{seconds / rows * 10**6:.2f}"
+
+
+@admin.register(DataSet)
+class DataSetAdmin(admin.ModelAdmin):
+    list_display = ["id", "schema", "rows", "status", "created_at", "slowest_column"]
+    list_filter = ["status", "schema__file_format"]
+    list_select_related = ["schema"]
+    readonly_fields = ["profile_table"]
+
+    @admin.display(description="Slowest column")
+    def slowest_column(self, dataset):
+        if not dataset.profile or not dataset.profile["columns"]:
+            return "-"
+        columns = dataset.profile["columns"]
+        total = sum(column["seconds"] for column in columns)
+        slowest = max(columns, key=lambda column: column["seconds"])
+        share = 100 * slowest["seconds"] / total if total else 0
+        return f"{slowest['name']} ({slowest['data_type']}, {share:.0f}%)"
+
+    @admin.display(description="Profile")
+    def profile_table(self, dataset):
+        profile = dataset.profile
+        if not profile:
+            return "-"
+        sampled_rows = max(profile["sampled_rows"], 1)
+        rows = format_html_join(
+            "",
+            "<tr><td>{}</td><td>{}</td><td>{}</td><td>{}</td><td>{}</td></tr>",
+            (
+                (
+                    column["name"],
+                    column["data_type"],
+                    _per_row(column["seconds"], sampled_rows),
+                    _per_row(column["provider_seconds"], sampled_rows),
+                    _per_row(column["sanitize_seconds"], sampled_rows),
+                )
+                for column in profile["columns"]
+            ),
+        )
+        return format_html(
+            "<p>{} of {} chunks sampled ({} rows); writing took {} µs/row.</p>"
+            "<table><tr><th>Column</th><th>Type</th><th>Total µs/row</th>"
+            "<th>Provider µs/row</th><th>Sanitize µs/row</th></tr>{}</table>",
+            profile["sampled_chunks"],
+            profile["chunks"],
+            profile["sampled_rows"],
+            _per_row(profile["write_seconds"], sampled_rows),
+            rows,
+        )
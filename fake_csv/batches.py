@@ -0,0 +1,177 @@
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import islice
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EPOCH = date(1970, 1, 1)
+
+# Line breaks and every separator and string character a schema can pick.
+# Generated strings never contain them, so CSV values never need quoting
+UNSAFE_CHARACTERS = '\n\r,;"“‘'
+SANITIZE = str.maketrans({"\n": " ", "\r": " ", **dict.fromkeys(',;"“‘')})
+
+# Sentences precomputed per bound Text column, and the range of words in
+# each, matching Faker's default of 6 words +/-40%
+SENTENCE_BANK_SIZE = 1024
+SENTENCE_WORDS = (3, 8)
+
+# Sentences picked per call, and the largest table of paragraph lengths
+# drawn from directly
+MAX_PICKS = 65536
+COUNT_TABLE_SIZE = 65536
+
+
+def scalar_batch(generate):
+    """Wrap a per-cell generator into a batch generator."""
+
+    def batch(size):
+        return [generate() for _ in range(size)]
+
+    return batch
+
+
+@lru_cache(maxsize=2)
+def iso_dates(end_ordinal):
+    """ISO strings of every day from the epoch up to ``end_ordinal``, inclusive."""
+    days = end_ordinal - EPOCH.toordinal() + 1
+    if numpy is not None:
+        return numpy.datetime_as_string(
+            numpy.arange(days).astype("datetime64[D]"), unit="D"
+        )
+    return [(EPOCH + timedelta(days=day)).isoformat() for day in range(days)]
+
+
+def integer_batch(fake, range_from, range_to):
+    """Draw integers in ``[range_from, range_to]`` a whole batch at a time."""
+    if numpy is not None:
+        integers = numpy.random.default_rng(fake.random.getrandbits(64)).integers
+
+        def batch(size):
+            return integers(range_from, range_to, size=size, endpoint=True).tolist()
+
+    else:
+        choices = fake.random.choices
+        population = range(range_from, range_to + 1)
+
+        def batch(size):
+            return choices(population, k=size)
+
+    return batch
+
+
+def date_batch(fake, range_from, range_to):
+    """
+    Draw dates between the epoch and today, like ``Faker.date()`` does.
+
+    Dates are drawn as epoch-day indexes and formatted in bulk through a
+    lookup table of ISO strings.
+    """
+    dates = iso_dates(date.today().toordinal())
+    if numpy is not None:
+        integers = numpy.random.default_rng(fake.random.getrandbits(64)).integers
+
+        def batch(size):
+            return dates[integers(0, len(dates), size=size)].tolist()
+
+    else:
+        choices = fake.random.choices
+
+        def batch(size):
+            return choices(dates, k=size)
+
+    return batch
+
+
+def _lorem(fake):
+    return next(
+        provider for provider in fake.providers if hasattr(provider, "word_list")
+    )
+
+
+def sentence_bank(fake):
+    """
+    Build ``SENTENCE_BANK_SIZE`` sanitized sentences from the words of the
+    locale's lorem provider, drawn with the random state of ``fake``.
+    """
+    lorem = _lorem(fake)
+    words = [word.translate(SANITIZE) for word in lorem.word_list]
+    connector = lorem.word_connector
+    choices = fake.random.choices
+    randint = fake.random.randint
+    sentences = []
+    for _ in range(SENTENCE_BANK_SIZE):
+        sentence = choices(words, k=randint(*SENTENCE_WORDS))
+        sentence[0] = sentence[0].title()
+        sentences.append(connector.join(sentence) + lorem.sentence_punctuation)
+    return sentences, connector
+
+
+def sentence_counts(fake, range_from, range_to):
+    """
+    Return a function drawing the sentence counts of ``size`` paragraphs.
+
+    Like ``Faker.paragraph()``, a count between ``range_from`` and
+    ``range_to`` is varied by +/-40%, keeping at least one sentence. Narrow
+    ranges draw from a table of every outcome in one call.
+    """
+    choices = fake.random.choices
+    counts = range(range_from, range_to + 1)
+    variations = range(60, 141)
+    if len(counts) * len(variations) <= COUNT_TABLE_SIZE:
+        table = [
+            max(count * variation // 100, 1) if count > 0 else 0
+            for count in counts
+            for variation in variations
+        ]
+        return lambda size: choices(table, k=size)
+
+    def draw(size):
+        return [
+            max(count * variation // 100, 1) if count > 0 else 0
+            for count, variation in zip(
+                choices(counts, k=size), choices(variations, k=size)
+            )
+        ]
+
+    return draw
+
+
+def text_batch(fake, range_from, range_to):
+    """
+    Draw paragraphs of ``range_from`` to ``range_to`` sentences, like
+    ``Faker.paragraph()`` does, a whole batch at a time.
+
+    Paragraphs join sentences picked from a bank built once per bind
+    instead of drawing every word through Faker, and the sentences of
+    many paragraphs are picked in one call. The bank is sanitized up
+    front, so values need no further pass. Picks are drawn at most
+    ``MAX_PICKS`` at a time, so memory beyond the paragraphs themselves
+    does not grow with ``range_to``.
+    """
+    sentences, connector = sentence_bank(fake)
+    draw_counts = sentence_counts(fake, range_from, range_to)
+    choices = fake.random.choices
+    join = connector.join
+    group = max(MAX_PICKS // max(range_to * 140 // 100, 1), 1)
+
+    def batch(size):
+        counts = draw_counts(size)
+        paragraphs = []
+        for start in range(0, size, group):
+            group_counts = counts[start : start + group]
+            picks = iter(choices(sentences, k=sum(group_counts)))
+            paragraphs.extend([join(islice(picks, count)) for count in group_counts])
+        return paragraphs
+
+    return batch
+
+
+BATCH_GENERATORS = {
+    "Integer": integer_batch,
+    "Date": date_batch,
+    "Text": text_batch,
+}
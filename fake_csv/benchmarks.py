@@ -0,0 +1,461 @@
+import csv
+import io
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from faker import Faker
+
+from .batches import BATCH_GENERATORS, scalar_batch
+from .compiler import DEFAULT_RANGES, GENERATORS, SchemaPlan
+from .compression import iter_compressed, zstandard
+from .fakers import borrow_faker, warm
+from .models import Column
+from .pools import POOLED_TYPES, get_pool
+from .unique import BloomFilter, ExactFilter, new_filter
+from .utils import ShardConfig, chunk_writer, iter_chunks, iter_column_chunks
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+COMPRESSION_LEVELS = {
+    "": (None,),
+    "gzip": (1, 6, 9),
+    "zip": (1, 6, 9),
+    "zstd": (1, 3, 9, 19),
+}
+
+DIALECT = {"delimiter": ",", "quotechar": '"'}
+
+# Rows generated under tracemalloc to measure allocations per row
+ALLOCATION_ROWS = 100
+
+# Sentence counts of the Text cases, drawn from 1 up to each value
+TEXT_RANGES = (3, 30, 300)
+
+# Row counts of the scale suite, capped by the requested number of rows
+ROW_COUNTS = (1000, 10000, 100000, 1000000, 10000000)
+
+# Values added to the filters of the unique suite, capped the same way
+UNIQUE_COUNTS = (100000, 1000000, 10000000)
+
+WIDE_COLUMNS = 50
+
+# Small jobs timed by the start-up suite, and their number of rows at most
+STARTUP_JOBS = 20
+STARTUP_ROWS = 100
+
+# Fields identifying a case when comparing results with a baseline
+KEY_FIELDS = ("suite", "case", "level", "rows")
+
+
+class ByteCounter:
+    """Text sink counting the UTF-8 bytes written to it."""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text.encode())
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, if the OS reports it."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def allocated_per_row(plan, rows):
+    """
+    Bytes allocated per row while one chunk of at most ``ALLOCATION_ROWS``
+    rows is generated and written.
+
+    This is the peak size traced by ``tracemalloc`` during the chunk, i.e.
+    the memory generation and writing hold on to per row at once. Tracing
+    slows Faker down by an order of magnitude, hence the small chunk.
+    """
+    config = ShardConfig(plan, DIALECT, settings.FAKE_CSV_CHUNK_SIZE, None)
+    fake = Faker(settings.FAKE_CSV_LOCALE)
+    fake.seed_instance(0)
+    batches = plan.bind(fake)
+    write = chunk_writer(ByteCounter(), config)
+    size = min(rows, config.chunk_size, ALLOCATION_ROWS)
+    tracemalloc.start()
+    try:
+        for size, columns in iter_column_chunks(batches, size, size):
+            write(size, columns)
+        return round(tracemalloc.get_traced_memory()[1] / size)
+    finally:
+        tracemalloc.stop()
+
+
+def _measure(plan, rows):
+    fake = Faker(settings.FAKE_CSV_LOCALE)
+    fake.seed_instance(0)
+    sink = ByteCounter()
+    config = ShardConfig(plan, DIALECT, settings.FAKE_CSV_CHUNK_SIZE, None)
+    csv.writer(sink, **DIALECT).writerow(plan.fieldnames)
+    write = chunk_writer(sink, config)
+    start = time.perf_counter()
+    for size, columns in iter_column_chunks(plan.bind(fake), rows, config.chunk_size):
+        write(size, columns)
+    elapsed = time.perf_counter() - start
+    rss = peak_rss()
+    return {
+        "rows_per_sec": round(rows / elapsed),
+        "bytes_per_sec": round(sink.bytes / elapsed),
+        "bytes": sink.bytes,
+        "peak_rss_mb": None if rss is None else round(rss / 2**20, 1),
+        "alloc_bytes_per_row": allocated_per_row(plan, rows),
+    }
+
+
+def measure(plan, rows):
+    """
+    Generate ``rows`` rows of ``plan`` and write them as CSV to a byte counter.
+
+    Every measurement runs in a fresh process, so the peak RSS it reports
+    belongs to that case alone rather than to the largest case run so far.
+    """
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(_measure, plan, rows).result()
+
+
+def _column(data_type, name=None):
+    range_from, range_to = DEFAULT_RANGES.get(data_type, (None, None))
+    return (name or data_type, data_type, range_from, range_to)
+
+
+def rows_per_second(batches, rows):
+    """Generate ``rows`` rows with ``batches`` and return the achieved rate."""
+    start = time.perf_counter()
+    for _ in iter_chunks(batches, rows, settings.FAKE_CSV_CHUNK_SIZE):
+        pass
+    return rows / (time.perf_counter() - start)
+
+
+def pools_suite(rows):
+    """Compare live Faker calls with pooled sampling for every pooled type."""
+    locale = settings.FAKE_CSV_LOCALE
+    results = []
+    for data_type in POOLED_TYPES:
+        plan = SchemaPlan([(data_type, data_type, None, None)])
+        pool = get_pool(data_type, locale)
+        fake = Faker(locale)
+        fake.seed_instance(0)
+        live = rows_per_second(plan.bind(fake), rows)
+        pooled = rows_per_second(plan.bind(fake, {data_type: pool}), rows)
+        results.append(
+            {
+                "suite": "pools",
+                "case": data_type,
+                "live_rows_per_sec": round(live),
+                "pooled_rows_per_sec": round(pooled),
+                "speedup": round(pooled / live, 1),
+            }
+        )
+    return results
+
+
+def batches_suite(rows):
+    """Compare per-cell Faker calls with batch generation for batched types."""
+    results = []
+    for data_type, batch_generator in BATCH_GENERATORS.items():
+        range_from, range_to = DEFAULT_RANGES.get(data_type, (0, 1000))
+        plan = SchemaPlan([(data_type, data_type, range_from, range_to)])
+        fake = Faker(settings.FAKE_CSV_LOCALE)
+        fake.seed_instance(0)
+        per_cell = rows_per_second(
+            [scalar_batch(GENERATORS[data_type](fake, range_from, range_to))], rows
+        )
+        batched = rows_per_second(plan.bind(fake), rows)
+        results.append(
+            {
+                "suite": "batches",
+                "case": data_type,
+                "per_cell_rows_per_sec": round(per_cell),
+                "batched_rows_per_sec": round(batched),
+                "speedup": round(batched / per_cell, 1),
+            }
+        )
+    return results
+
+
+def compression_suite(rows):
+    """Measure compression speed and ratio of every codec on one sample CSV."""
+    fake = Faker(settings.FAKE_CSV_LOCALE)
+    fake.seed_instance(0)
+    plan = SchemaPlan(
+        [
+            ("name", "Full name", None, None),
+            ("email", "Email", None, None),
+            ("age", "Integer", 18, 99),
+            ("joined", "Date", None, None),
+            ("bio", "Text", 1, 3),
+        ]
+    )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for chunk in iter_chunks(plan.bind(fake), rows, settings.FAKE_CSV_CHUNK_SIZE):
+        writer.writerows(chunk)
+    text = buffer.getvalue()
+    size = len(text.encode())
+    results = []
+    for compression, levels in COMPRESSION_LEVELS.items():
+        if compression == "zstd" and zstandard is None:
+            continue
+        for level in levels:
+            start = time.perf_counter()
+            compressed = b"".join(iter_compressed([text], compression, level=level))
+            elapsed = time.perf_counter() - start
+            results.append(
+                {
+                    "suite": "compression",
+                    "case": compression or "none",
+                    "level": level,
+                    "mb_per_sec": round(size / elapsed / 10**6, 1),
+                    "bytes": len(compressed),
+                    "ratio": round(size / len(compressed), 2),
+                }
+            )
+    return results
+
+
+def types_suite(rows):
+    """Measure every column data type on its own."""
+    results = []
+    for data_type, _ in Column.TYPES:
+        plan = SchemaPlan([_column(data_type)])
+        results.append({"suite": "types", "case": data_type, **measure(plan, rows)})
+    return results
+
+
+def shapes_suite(rows):
+    """Compare a narrow schema with a wide one cycling through every data type."""
+    types = [data_type for data_type, _ in Column.TYPES]
+    shapes = {
+        "narrow": [_column("Full name"), _column("Integer")],
+        "wide": [
+            _column(data_type, f"column_{index}")
+            for index, data_type in enumerate(islice(cycle(types), WIDE_COLUMNS))
+        ],
+    }
+    results = []
+    for case, columns in shapes.items():
+        result = measure(SchemaPlan(columns), rows)
+        results.append(
+            {
+                "suite": "shapes",
+                "case": case,
+                "columns": len(columns),
+                "cells_per_sec": result["rows_per_sec"] * len(columns),
+                **result,
+            }
+        )
+    return results
+
+
+def text_suite(rows):
+    """Measure Text columns with growing numbers of sentences per cell."""
+    results = []
+    for range_to in TEXT_RANGES:
+        plan = SchemaPlan([("text", "Text", 1, range_to)])
+        results.append(
+            {"suite": "text", "case": f"1-{range_to}", **measure(plan, rows)}
+        )
+    return results
+
+
+def scale_suite(rows):
+    """Measure a mixed schema at every row count in ``ROW_COUNTS`` up to ``rows``."""
+    plan = SchemaPlan(
+        [
+            _column("Full name", "name"),
+            _column("Email", "email"),
+            _column("Integer", "age"),
+            _column("Date", "joined"),
+        ]
+    )
+    results = []
+    for count in ROW_COUNTS:
+        if count > rows:
+            break
+        results.append(
+            {"suite": "scale", "case": "mixed", "rows": count, **measure(plan, count)}
+        )
+    return results
+
+
+def write_suite(rows):
+    """Compare ``csv.writer`` with ``chunk_writer`` on already generated chunks."""
+    shapes = {
+        "mixed": [
+            _column("Full name", "name"),
+            _column("Integer", "age"),
+            _column("Date", "joined"),
+        ],
+        "text": [("text", "Text", 1, 30)],
+    }
+    results = []
+    for case, columns in shapes.items():
+        plan = SchemaPlan(columns)
+        fake = Faker(settings.FAKE_CSV_LOCALE)
+        fake.seed_instance(0)
+        chunks = list(
+            iter_column_chunks(plan.bind(fake), rows, settings.FAKE_CSV_CHUNK_SIZE)
+        )
+        timings = {}
+        writer = csv.writer(ByteCounter(), **DIALECT)
+        start = time.perf_counter()
+        for _, chunk_columns in chunks:
+            writer.writerows(zip(*chunk_columns))
+        timings["csv_writer"] = time.perf_counter() - start
+        config = ShardConfig(plan, DIALECT, settings.FAKE_CSV_CHUNK_SIZE, None)
+        write = chunk_writer(ByteCounter(), config)
+        start = time.perf_counter()
+        for size, chunk_columns in chunks:
+            write(size, chunk_columns)
+        timings["chunk_writer"] = time.perf_counter() - start
+        results.append(
+            {
+                "suite": "write",
+                "case": case,
+                "csv_writer_rows_per_sec": round(rows / timings["csv_writer"]),
+                "chunk_writer_rows_per_sec": round(rows / timings["chunk_writer"]),
+                "speedup": round(timings["csv_writer"] / timings["chunk_writer"], 1),
+            }
+        )
+    return results
+
+
+def unique_suite(rows):
+    """
+    Measure the filters of unique columns holding up to 10M values: adds/sec
+    and memory of the exact set and the Bloom filter, and the rows/sec of a
+    unique Integer column next to a plain one.
+    """
+    max_tries = settings.FAKE_CSV_UNIQUE_MAX_TRIES
+    results = []
+    for count in sorted({min(count, rows) for count in UNIQUE_COUNTS}):
+        error_rate = settings.FAKE_CSV_UNIQUE_ERROR_RATE
+        for case, seen in (
+            ("exact", ExactFilter(max_tries)),
+            ("bloom", BloomFilter(count, error_rate, max_tries)),
+        ):
+            start = time.perf_counter()
+            for offset in range(0, count, settings.FAKE_CSV_CHUNK_SIZE):
+                seen.add_many(
+                    range(offset, min(offset + settings.FAKE_CSV_CHUNK_SIZE, count))
+                )
+            elapsed = time.perf_counter() - start
+            results.append(
+                {
+                    "suite": "unique",
+                    "case": case,
+                    "rows": count,
+                    "adds_per_sec": round(count / elapsed),
+                    "filter_mb": round(seen.nbytes / 2**20, 1),
+                    "false_positives": count - len(seen),
+                }
+            )
+
+    column = ("id", "Integer", 0, rows * 10)
+    fake = Faker(settings.FAKE_CSV_LOCALE)
+    fake.seed_instance(0)
+    plain = rows_per_second(SchemaPlan([column]).bind(fake), rows)
+    unique = rows_per_second(
+        SchemaPlan([column], [True]).bind(fake, filters={0: new_filter(rows)}), rows
+    )
+    results.append(
+        {
+            "suite": "unique",
+            "case": "integer column",
+            "rows": rows,
+            "plain_rows_per_sec": round(plain),
+            "unique_rows_per_sec": round(unique),
+        }
+    )
+    return results
+
+
+def startup_suite(rows):
+    """Compare small jobs building a fresh Faker with jobs borrowing a pooled one."""
+    plan = SchemaPlan([_column("Full name", "name"), _column("Integer", "age")])
+    locale = settings.FAKE_CSV_LOCALE
+    rows = min(rows, STARTUP_ROWS)
+    warm([locale])
+
+    def fresh(seed):
+        fake = Faker(locale)
+        fake.seed_instance(seed)
+        for _ in iter_chunks(plan.bind(fake), rows, settings.FAKE_CSV_CHUNK_SIZE):
+            pass
+
+    def pooled(seed):
+        with borrow_faker(locale, seed) as fake:
+            for _ in iter_chunks(plan.bind(fake), rows, settings.FAKE_CSV_CHUNK_SIZE):
+                pass
+
+    timings = {}
+    for case, job in (("fresh", fresh), ("pooled", pooled)):
+        start = time.perf_counter()
+        for seed in range(STARTUP_JOBS):
+            job(seed)
+        timings[case] = (time.perf_counter() - start) / STARTUP_JOBS
+    return [
+        {
+            "suite": "startup",
+            "case": f"{rows} rows",
+            "fresh_ms_per_job": round(timings["fresh"] * 1000, 2),
+            "pooled_ms_per_job": round(timings["pooled"] * 1000, 2),
+            "speedup": round(timings["fresh"] / timings["pooled"], 1),
+        }
+    ]
+
+
+def result_key(result):
+    return tuple(result.get(field) for field in KEY_FIELDS)
+
+
+def find_regressions(baseline, results, threshold):
+    """
+    Describe every throughput in ``results`` that fell by more than the
+    ``threshold`` fraction below the same case of the ``baseline`` results.
+    """
+    previous = {result_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        for metric, value in result.items():
+            if not metric.endswith("_per_sec") or not old.get(metric):
+                continue
+            if value < old[metric] * (1 - threshold):
+                case = " ".join(str(part) for part in result_key(result) if part)
+                regressions.append(
+                    f"{case}: {metric} fell from {old[metric]} to {value}"
+                )
+    return regressions
+
+
+SUITES = {
+    "batches": batches_suite,
+    "compression": compression_suite,
+    "pools": pools_suite,
+    "scale": scale_suite,
+    "shapes": shapes_suite,
+    "startup": startup_suite,
+    "text": text_suite,
+    "types": types_suite,
+    "unique": unique_suite,
+    "write": write_suite,
+}
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import date
+from functools import partial
+
+import faker
+from django.conf import settings
+
+from .batches import numpy
+from .compiler import ENGINE_VERSION, get_plan
+from .columnar import EXTENSIONS as COLUMNAR_EXTENSIONS, generate_columnar
+from .compression import EXTENSIONS as COMPRESSED_EXTENSIONS, compression_level
+from .utils import generate_csv, new_filepath
+
+
+def cache_key(schema, rows, seed, locale, pooled, compression=""):
+    """
+    Hash everything that determines the bytes of a seeded dataset.
+
+    Besides the compiled schema, row count, seed and locale this covers
+    the settings that change how values are drawn, whether numpy draws
+    them, and today's date for schemas with dates, which are drawn up to
+    today, so a cached file is only reused when regenerating it would
+    produce the same output.
+    """
+    plan = get_plan(schema)
+    has_dates = any(data_type == "Date" for _, data_type, _, _ in plan.columns)
+    fingerprint = {
+        "columns": plan.columns,
+        "unique": plan.unique,
+        "unique_filter": (
+            [
+                settings.FAKE_CSV_UNIQUE_EXACT_LIMIT,
+                settings.FAKE_CSV_UNIQUE_ERROR_RATE,
+                settings.FAKE_CSV_UNIQUE_MAX_TRIES,
+            ]
+            if any(plan.unique)
+            else None
+        ),
+        "today": date.today().isoformat() if has_dates else None,
+        "numpy": numpy is not None,
+        "dialect": [schema.column_separator, schema.string_character],
+        "file_format": schema.file_format,
+        "rows": rows,
+        "seed": seed,
+        "locale": locale,
+        "pool_size": settings.FAKE_CSV_POOL_SIZE if pooled else None,
+        "chunk_size": settings.FAKE_CSV_CHUNK_SIZE,
+        "shard_rows": settings.FAKE_CSV_SHARD_ROWS,
+        "compression": compression,
+        "compression_level": compression_level(compression) if compression else None,
+        "faker": faker.VERSION,
+        "engine": ENGINE_VERSION,
+    }
+    encoded = json.dumps(fingerprint, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def cache_path(key, extension="csv"):
+    return os.path.join(settings.FAKE_CSV_CACHE_DIR, f"{key}.{extension}")
+
+
+def link_or_copy(source, destination):
+    """Hard link ``source`` to ``destination``, copying across file systems."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+def fetch(key, extension="csv"):
+    """
+    Return a new dataset file sharing the cache entry of ``key``, or ``None``.
+
+    A hit refreshes the entry's modification time, which eviction uses as
+    its last-used time.
+    """
+    path = cache_path(key, extension)
+    if not os.path.exists(path):
+        return None
+    filepath = new_filepath(extension)
+    try:
+        link_or_copy(path, filepath)
+    except FileNotFoundError:
+        return None
+    os.utime(path)
+    return filepath
+
+
+def store(key, filepath, extension="csv"):
+    """Add the generated ``filepath`` to the cache under ``key``."""
+    os.makedirs(settings.FAKE_CSV_CACHE_DIR, exist_ok=True)
+    path = cache_path(key, extension)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    link_or_copy(filepath, temp_path)
+    os.replace(temp_path, path)
+
+
+def evict():
+    """
+    Drop cache entries older than ``FAKE_CSV_CACHE_MAX_AGE`` seconds, then
+    the least recently used ones until the cache fits in
+    ``FAKE_CSV_CACHE_MAX_BYTES``.
+
+    Datasets keep their own hard link, so evicting an entry never removes
+    a file a dataset still points to.
+    """
+    if not os.path.isdir(settings.FAKE_CSV_CACHE_DIR):
+        return
+    entries = []
+    for entry in os.scandir(settings.FAKE_CSV_CACHE_DIR):
+        if entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    entries.sort()
+    total_size = sum(size for _, size, _ in entries)
+    oldest_allowed = time.time() - settings.FAKE_CSV_CACHE_MAX_AGE
+    for mtime, size, path in entries:
+        if mtime >= oldest_allowed and total_size <= settings.FAKE_CSV_CACHE_MAX_BYTES:
+            break
+        os.remove(path)
+        total_size -= size
+
+
+def generate_cached(
+    schema,
+    rows,
+    seed=None,
+    on_chunk=None,
+    pooled=None,
+    locale=None,
+    compression="",
+    profile=None,
+    checkpoint=None,
+    on_checkpoint=None,
+):
+    """
+    Generate a dataset file, reusing a cached one for repeated seeded requests.
+
+    The file is written in the schema's file format. Unseeded datasets
+    are random by definition and always generated. ``profile`` is left
+    empty when a cached file is reused. ``checkpoint`` and
+    ``on_checkpoint`` are passed on to ``generate_csv``; the partial file of
+    ``checkpoint`` is removed when a cached file is reused instead.
+    """
+    if schema.file_format == "csv":
+        generate = generate_csv
+        extension = COMPRESSED_EXTENSIONS[compression]
+    else:
+        generate = partial(generate_columnar, file_format=schema.file_format)
+        extension = COLUMNAR_EXTENSIONS[schema.file_format]
+    if on_checkpoint is not None:
+        generate = partial(generate, checkpoint=checkpoint, on_checkpoint=on_checkpoint)
+    if seed is None:
+        return generate(
+            schema,
+            rows,
+            on_chunk=on_chunk,
+            pooled=pooled,
+            locale=locale,
+            compression=compression,
+            profile=profile,
+        )
+    if pooled is None:
+        pooled = settings.FAKE_CSV_POOLED
+    if locale is None:
+        locale = schema.locale
+    key = cache_key(schema, rows, seed, locale, pooled, compression)
+    filepath = fetch(key, extension)
+    if filepath is None:
+        filepath = generate(
+            schema,
+            rows,
+            on_chunk=on_chunk,
+            seed=seed,
+            pooled=pooled,
+            locale=locale,
+            compression=compression,
+            profile=profile,
+        )
+        store(key, filepath, extension)
+        evict()
+    elif checkpoint is not None:
+        partial_path = os.path.join(settings.MEDIA_ROOT, checkpoint["path"])
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return filepath
@@ -0,0 +1,160 @@
+import os
+import random
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .compression import compression_level
+from .profiling import Profiler
+from .utils import (
+    bind_shard,
+    iter_column_chunks,
+    iter_shards,
+    new_filepath,
+    shard_config,
+    shard_seed,
+)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXTENSIONS = {
+    "parquet": "parquet",
+    "arrow": "arrows",
+}
+
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+# Internal codecs each format supports, by DataSet.compression
+CODECS = {
+    "parquet": {"": "snappy", "gzip": "gzip", "zstd": "zstd"},
+    "arrow": {"": None, "zstd": "zstd"},
+}
+
+# Low-cardinality string types worth dictionary encoding
+DICTIONARY_TYPES = {"Job"}
+
+
+def check_options(file_format, compression):
+    """Raise ``ValueError`` when ``file_format`` cannot use ``compression``."""
+    if compression not in CODECS[file_format]:
+        raise ValueError(
+            f"{file_format.capitalize()} files do not support "
+            f"{compression or 'no'} compression."
+        )
+
+
+def arrow_schema(plan, pools=None):
+    """
+    Build the Arrow schema of ``plan``.
+
+    Integers are int64, dates date32, low-cardinality and pooled strings
+    dictionary-encoded strings and everything else plain strings.
+    """
+    fields = []
+    for pooled, (name, data_type, _, _) in zip(plan.pooled(pools), plan.columns):
+        if data_type == "Integer":
+            field_type = pyarrow.int64()
+        elif data_type == "Date":
+            field_type = pyarrow.date32()
+        elif pooled or data_type in DICTIONARY_TYPES:
+            field_type = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+        else:
+            field_type = pyarrow.string()
+        fields.append(pyarrow.field(name, field_type))
+    return pyarrow.schema(fields)
+
+
+def record_batch(schema, columns):
+    """Convert one chunk of generated ``columns`` into a record batch."""
+    arrays = []
+    for field, values in zip(schema, columns):
+        if pyarrow.types.is_date32(field.type):
+            array = pyarrow.array(values, pyarrow.string()).cast(field.type)
+        elif pyarrow.types.is_dictionary(field.type):
+            array = pyarrow.array(values, pyarrow.string()).dictionary_encode()
+        else:
+            array = pyarrow.array(values, field.type)
+        arrays.append(array)
+    return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def open_writer(filepath, file_format, schema, compression):
+    codec = CODECS[file_format][compression]
+    level = compression_level(compression) if compression else None
+    if file_format == "parquet":
+        return pyarrow.parquet.ParquetWriter(
+            filepath, schema, compression=codec, compression_level=level
+        )
+    options = pyarrow.ipc.IpcWriteOptions(
+        compression=pyarrow.Codec(codec, level) if codec else None
+    )
+    return pyarrow.ipc.new_stream(filepath, schema, options=options)
+
+
+def generate_columnar(
+    schema,
+    rows,
+    file_format,
+    on_chunk=None,
+    seed=None,
+    pooled=None,
+    locale=None,
+    compression="",
+    profile=None,
+):
+    """
+    Generate a Parquet or Arrow IPC stream file with ``rows`` fake rows.
+
+    Rows are generated in the same seeded shards and chunks as
+    ``generate_csv``, and every chunk is written as its own record batch,
+    i.e. Parquet row group, so memory use does not depend on ``rows``.
+    ``compression`` selects the format's internal codec and ``profile``
+    works as in ``generate_csv``. Requires the optional ``pyarrow`` package.
+    """
+    if pyarrow is None:
+        raise ImproperlyConfigured(
+            f"{file_format.capitalize()} output requires the pyarrow package."
+        )
+    check_options(file_format, compression)
+    config = shard_config(schema, pooled, locale, rows)
+    if seed is None:
+        seed = random.getrandbits(64)
+    arrow = arrow_schema(config.plan, config.pools)
+    profiler = None
+    if profile is not None:
+        profiler = Profiler(
+            config.plan, config.pools, max(settings.FAKE_CSV_PROFILE_EVERY, 1)
+        )
+
+    filepath = new_filepath(EXTENSIONS[file_format])
+    try:
+        with open_writer(filepath, file_format, arrow, compression) as writer:
+            rows_done = 0
+            for index, shard_rows in iter_shards(rows, settings.FAKE_CSV_SHARD_ROWS):
+                with bind_shard(config, shard_seed(seed, index)) as batches:
+                    for size, columns in iter_column_chunks(
+                        batches, shard_rows, config.chunk_size, profiler
+                    ):
+                        batch = record_batch(arrow, columns)
+                        if profiler is not None and profiler.sampling:
+                            profiler.write(writer.write_batch, batch)
+                        else:
+                            writer.write_batch(batch)
+                        rows_done += size
+                        if on_chunk is not None:
+                            on_chunk(rows_done, os.path.getsize(filepath))
+    except BaseException:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+    if profiler is not None:
+        profile.update(profiler.summary())
+    return filepath
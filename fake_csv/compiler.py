@@ -0,0 +1,218 @@
+from functools import partial
+
+from django.db.models import F
+
+from .batches import BATCH_GENERATORS, SANITIZE, scalar_batch
+from .fakers import borrow_faker
+from .unique import unique_batch
+
+# Bumped whenever generators draw different values for the same seed
+ENGINE_VERSION = 3
+
+DEFAULT_INTEGER_RANGE = (0, 9999)
+DEFAULT_TEXT_SENTENCES = (3, 3)
+
+_plans = {}
+
+
+def _sanitized(provider):
+    def generate():
+        return provider().translate(SANITIZE)
+
+    return generate
+
+
+def _full_name(fake, range_from, range_to):
+    return _sanitized(fake.name)
+
+
+def _job(fake, range_from, range_to):
+    return _sanitized(fake.job)
+
+
+def _email(fake, range_from, range_to):
+    return _sanitized(fake.email)
+
+
+def _domain_name(fake, range_from, range_to):
+    return _sanitized(fake.domain_name)
+
+
+def _phone_number(fake, range_from, range_to):
+    return _sanitized(fake.phone_number)
+
+
+def _company_name(fake, range_from, range_to):
+    return _sanitized(fake.company)
+
+
+def _text(fake, range_from, range_to):
+    randint = fake.random.randint
+    paragraph = fake.paragraph
+
+    def generate():
+        return paragraph(
+            variable_nb_sentences=True, nb_sentences=randint(range_from, range_to)
+        ).translate(SANITIZE)
+
+    return generate
+
+
+def _integer(fake, range_from, range_to):
+    randint = fake.random.randint
+
+    def generate():
+        return randint(range_from, range_to)
+
+    return generate
+
+
+def _address(fake, range_from, range_to):
+    return _sanitized(fake.address)
+
+
+def _date(fake, range_from, range_to):
+    return _sanitized(fake.date)
+
+
+# Every generator returns integers or strings run through ``SANITIZE``
+GENERATORS = {
+    "Full name": _full_name,
+    "Job": _job,
+    "Email": _email,
+    "Domain name": _domain_name,
+    "Phone number": _phone_number,
+    "Company name": _company_name,
+    "Text": _text,
+    "Integer": _integer,
+    "Address": _address,
+    "Date": _date,
+}
+
+# Types whose per-cell generator passes every value through ``SANITIZE``
+SANITIZED_TYPES = {
+    "Full name",
+    "Job",
+    "Email",
+    "Domain name",
+    "Phone number",
+    "Company name",
+    "Text",
+    "Address",
+    "Date",
+}
+
+DEFAULT_RANGES = {
+    "Integer": DEFAULT_INTEGER_RANGE,
+    "Text": DEFAULT_TEXT_SENTENCES,
+}
+
+
+def unsupported_types(locale, data_types):
+    """
+    Return the ``data_types`` whose generator cannot bind to a Faker of
+    ``locale``; a few locales lack providers, e.g. phone numbers in en_PH.
+    """
+    unsupported = []
+    with borrow_faker(locale) as fake:
+        for data_type in data_types:
+            range_from, range_to = DEFAULT_RANGES.get(data_type, (None, None))
+            try:
+                GENERATORS[data_type](fake, range_from, range_to)
+            except AttributeError:
+                unsupported.append(data_type)
+    return unsupported
+
+
+class SchemaPlan:
+    """
+    Compiled, Faker-independent description of a schema's columns.
+
+    ``columns`` holds ``(name, data_type, range_from, range_to)`` tuples in
+    output order with default ranges already resolved, so the plan can be
+    cached and shared between jobs. ``unique`` flags the columns whose
+    values must not repeat. ``bind`` turns it into the list of batch
+    generators the generation loop calls for every chunk.
+    """
+
+    def __init__(self, columns, unique=None):
+        self.columns = columns
+        self.unique = unique or [False] * len(columns)
+        self.fieldnames = [name for name, _, _, _ in columns]
+
+    def pooled(self, pools=None):
+        """Flag the columns that sample values from ``pools``."""
+        pools = pools or {}
+        return [
+            data_type in pools and not unique
+            for (_, data_type, _, _), unique in zip(self.columns, self.unique)
+        ]
+
+    def bind(self, fake, pools=None, filters=None):
+        """
+        Return the column batch generators bound to ``fake``.
+
+        Each generator takes a size and returns a list of that many values.
+        Integer and date columns are drawn a whole batch at a time, columns
+        whose data type has an entry in ``pools`` sample values from that
+        pool, and the rest call their Faker provider once per value. Unique
+        columns never sample pools, which are too small, and skip the
+        values already in their entry of ``filters``.
+        """
+        filters = filters or {}
+        batches = []
+        for index, (pooled, (name, data_type, range_from, range_to)) in enumerate(
+            zip(self.pooled(pools), self.columns)
+        ):
+            if pooled:
+                batch = partial(pools[data_type].sample, fake.random)
+            elif data_type in BATCH_GENERATORS:
+                batch = BATCH_GENERATORS[data_type](fake, range_from, range_to)
+            else:
+                batch = scalar_batch(GENERATORS[data_type](fake, range_from, range_to))
+            if index in filters:
+                batch = unique_batch(batch, filters[index], name)
+            batches.append(batch)
+        return batches
+
+    def sanitized(self, pools=None):
+        """Flag the columns whose bound generator sanitizes every value it draws."""
+        return [
+            data_type in SANITIZED_TYPES
+            and not pooled
+            and data_type not in BATCH_GENERATORS
+            for pooled, (_, data_type, _, _) in zip(self.pooled(pools), self.columns)
+        ]
+
+
+def compile_schema(schema):
+    columns = []
+    unique = []
+    for column in schema.columns.order_by("order", "pk"):
+        default_from, default_to = DEFAULT_RANGES.get(column.data_type, (None, None))
+        range_from = default_from if column.range_from is None else column.range_from
+        range_to = default_to if column.range_to is None else column.range_to
+        columns.append((column.name, column.data_type, range_from, range_to))
+        unique.append(column.unique)
+    return SchemaPlan(columns, unique)
+
+
+def get_plan(schema):
+    """Return the compiled plan for ``schema``, compiling it on a cache miss."""
+    key = (schema.pk, schema.version)
+    plan = _plans.get(key)
+    if plan is None:
+        for stale_key in [k for k in _plans if k[0] == schema.pk]:
+            del _plans[stale_key]
+        plan = _plans[key] = compile_schema(schema)
+    return plan
+
+
+def invalidate_plan(schema):
+    """
+    Bump the version stamp of ``schema`` so every process recompiles its plan.
+    """
+    schema.__class__.objects.filter(pk=schema.pk).update(version=F("version") + 1)
+    schema.refresh_from_db(fields=["version"])
+    for stale_key in [k for k in _plans if k[0] == schema.pk]:
+        del _plans[stale_key]
@@ -0,0 +1,117 @@
+import gzip
+import io
+import zipfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {
+    "": "csv",
+    "gzip": "csv.gz",
+    "zip": "zip",
+    "zstd": "csv.zst",
+}
+
+CONTENT_TYPES = {
+    "": "text/csv",
+    "gzip": "application/gzip",
+    "zip": "application/zip",
+    "zstd": "application/zstd",
+}
+
+
+class Pipe(io.RawIOBase):
+    """
+    Unseekable byte sink whose contents are taken out with ``drain``.
+
+    Lets the compressors write into memory while the compressed bytes are
+    handed on chunk by chunk, e.g. to a streaming response.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compression_level(compression):
+    return settings.FAKE_CSV_COMPRESSION_LEVELS[compression]
+
+
+@contextmanager
+def open_output(fileobj, compression, member_name="dataset.csv", level=None):
+    """
+    Open a text stream writing CSV through ``compression`` into ``fileobj``.
+
+    ``fileobj`` is a binary file object and ``compression`` a key of
+    ``EXTENSIONS``; the empty string writes uncompressed text. Zip archives
+    hold a single member called ``member_name``. ``level`` defaults to the
+    codec's entry in ``FAKE_CSV_COMPRESSION_LEVELS``.
+    """
+    if compression and level is None:
+        level = compression_level(compression)
+    with ExitStack() as stack:
+        if compression == "":
+            raw = fileobj
+        elif compression == "gzip":
+            raw = stack.enter_context(
+                gzip.GzipFile(
+                    fileobj=fileobj,
+                    mode="wb",
+                    compresslevel=level,
+                    mtime=0,
+                )
+            )
+        elif compression == "zip":
+            archive = stack.enter_context(
+                zipfile.ZipFile(
+                    fileobj,
+                    "w",
+                    compression=zipfile.ZIP_DEFLATED,
+                    compresslevel=level,
+                )
+            )
+            raw = stack.enter_context(archive.open(member_name, "w", force_zip64=True))
+        elif compression == "zstd":
+            if zstandard is None:
+                raise ImproperlyConfigured(
+                    "zstd compression requires the zstandard package."
+                )
+            compressor = zstandard.ZstdCompressor(level=level)
+            raw = stack.enter_context(compressor.stream_writer(fileobj, closefd=False))
+        else:
+            raise ValueError(f"Unknown compression {compression!r}.")
+        text = io.TextIOWrapper(raw, encoding="utf-8", newline="", write_through=True)
+        try:
+            yield text
+            text.flush()
+        finally:
+            text.detach()
+
+
+def iter_compressed(chunks, compression, member_name="dataset.csv", level=None):
+    """Compress the text ``chunks`` on the fly, yielding compressed bytes."""
+    pipe = Pipe()
+    with open_output(pipe, compression, member_name, level) as output:
+        for chunk in chunks:
+            output.write(chunk)
+            data = pipe.drain()
+            if data:
+                yield data
+    yield pipe.drain()
@@ -0,0 +1,137 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from slugify import slugify
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeFile:
+    """Read at most ``length`` bytes of ``file`` from its current position."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    """Strong ETag of a generated file, which never changes once written."""
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+
+def parse_range(header, size):
+    """
+    Return the ``(start, end)`` bytes, inclusive, of a single-range
+    ``Range`` header, or None when it is missing or malformed.
+
+    Several ranges are not supported and also return None, which serves
+    the whole file as the RFC allows. An unsatisfiable range raises
+    ``ValueError``.
+    """
+    match = RANGE_RE.match(header or "")
+    if match is None or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if not start:
+        # The last ``end`` bytes
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def if_range_matches(header, etag, last_modified):
+    """Return whether the ``If-Range`` validator still matches the file."""
+    if not header:
+        return True
+    if header.startswith(('"', "W/")):
+        return header == etag
+    return parse_http_date_safe(header) == last_modified
+
+
+def serve_file(request, path, filename, content_type=None):
+    """
+    Serve the file at ``path`` as an attachment named ``filename``, of
+    ``content_type`` or the type guessed from its name.
+
+    Conditional requests are answered from the file's ETag and modification
+    time, and a single byte range is served as a 206 response, so
+    interrupted downloads can resume. With ``FAKE_CSV_SENDFILE_HEADER`` set,
+    the response only carries the file's location for a front proxy to
+    serve, which then handles ranges and validators itself. Otherwise the
+    open file is handed to the server, which sends it with ``sendfile``
+    when it can.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    header = settings.FAKE_CSV_SENDFILE_HEADER
+    if header:
+        response = HttpResponse(content_type=content_type)
+        if content_type is None:
+            # Left for the proxy to derive from the file
+            del response["Content-Type"]
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        if header == "X-Accel-Redirect":
+            relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+            response[header] = settings.FAKE_CSV_SENDFILE_PREFIX + relative
+        else:
+            response[header] = path
+        return response
+
+    size = stat.st_size
+    byte_range = None
+    if if_range_matches(request.headers.get("If-Range"), etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    file = open(path, "rb")
+    if byte_range is None:
+        response = FileResponse(
+            file, as_attachment=True, filename=filename, content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        file.seek(start)
+        if end < size - 1:
+            file = RangeFile(file, end - start + 1)
+        response = FileResponse(
+            file, as_attachment=True, filename=filename, content_type=content_type
+        )
+        response.status_code = 206
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def download_filename(dataset):
+    """Name a dataset's file after its schema, keeping the file's extensions."""
+    extension = os.path.basename(dataset.file.name).partition(".")[2]
+    return f"{slugify(dataset.schema.name) or 'dataset'}.{extension}"
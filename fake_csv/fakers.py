@@ -0,0 +1,42 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from faker import Faker
+
+_idle = defaultdict(list)
+_lock = threading.Lock()
+
+
+@contextmanager
+def borrow_faker(locale, seed=None):
+    """
+    Lend a Faker of ``locale`` reseeded with ``seed`` from the process pool.
+
+    Building a Faker loads every provider and its locale data, so idle
+    instances are kept per locale and reused by later jobs. A borrowed
+    instance belongs to the caller alone until it is returned on exit,
+    which makes the pool safe to share between threads. ``seed=None``
+    reseeds it from the OS.
+    """
+    with _lock:
+        idle = _idle[locale]
+        fake = idle.pop() if idle else None
+    if fake is None:
+        fake = Faker(locale)
+    fake.seed_instance(seed)
+    try:
+        yield fake
+    finally:
+        with _lock:
+            _idle[locale].append(fake)
+
+
+def warm(locales, count=1):
+    """Make sure at least ``count`` idle Fakers of every locale are pooled."""
+    for locale in set(locales):
+        with _lock:
+            missing = count - len(_idle[locale])
+        fakers = [Faker(locale) for _ in range(missing)]
+        with _lock:
+            _idle[locale].extend(fakers)
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.forms import BaseModelFormSet, modelformset_factory
+from faker.config import AVAILABLE_LOCALES
 
 from .models import Column, DataSchema, DataSet
 
@@ -6,21 +9,83 @@ from .models import Column, DataSchema, DataSet
 class SchemasForm(forms.ModelForm):
     class Meta:
         model = DataSchema
-        fields = ["name", "column_separator", "string_character"]
+        fields = [
+            "name",
+            "column_separator",
+            "string_character",
+            "file_format",
+            "locale",
+        ]
+        widgets = {
+            "locale": forms.Select(
+                choices=[(locale, locale) for locale in sorted(AVAILABLE_LOCALES)]
+            )
+        }
 
 
 class SchemasColumnForm(forms.ModelForm):
     class Meta:
         model = Column
-        fields = ["name", "data_type", "range_from", "range_to", "order"]
+        fields = ["name", "data_type", "range_from", "range_to", "unique", "order"]
         labels = {
             "range_from": "From",
             "range_to": "To",
         }
 
 
+class FormSetPkField(forms.ModelChoiceField):
+    """Primary key field of a model formset resolving ids in its queryset."""
+
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super().__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            instance = self.formset._existing_object(
+                self.formset.model._meta.pk.to_python(value)
+            )
+        except ValidationError:
+            instance = None
+        if instance is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return instance
+
+
+class BaseColumnFormSet(BaseModelFormSet):
+    """
+    Model formset validating submitted column ids against its queryset,
+    which is fetched once, instead of with one query per form.
+    """
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        name = self.model._meta.pk.name
+        field = form.fields[name]
+        form.fields[name] = FormSetPkField(
+            self,
+            field.queryset,
+            initial=field.initial,
+            required=False,
+            widget=field.widget,
+        )
+
+
+ColumnFormSet = modelformset_factory(
+    Column, form=SchemasColumnForm, formset=BaseColumnFormSet, extra=0
+)
+
+
 class DataschemaForm(forms.ModelForm):
+    rows = forms.IntegerField(label="Rows", min_value=1)
+
     class Meta:
         model = DataSet
-        fields = ["rows"]
-        labels = {"rows": "Rows"}
+        fields = ["rows", "seed", "compression"]
+        labels = {"seed": "Seed", "compression": "Compression"}
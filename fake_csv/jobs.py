@@ -0,0 +1,455 @@
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.contrib.auth.models import User
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .cache import generate_cached
+from .compiler import get_plan
+from .fakers import warm
+from .models import DataSchema, DataSet, GenerationJob, StreamUsage
+from .scheduling import QUOTA_WINDOW, estimate_cost, priority, quota_start
+from .unique import UniqueExhausted
+from .utils import Cancelled
+
+
+class LeaseLost(Exception):
+    """Raised when another worker has taken over a job this worker was running."""
+
+
+def worker_name(index=0):
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+def _usage(user_id, now, dataset=None):
+    """
+    Return the ``(start, rows)`` pairs counted against the row quota of a
+    user: jobs other than the one of ``dataset`` and streams.
+    """
+    since = now - QUOTA_WINDOW
+    jobs = (
+        GenerationJob.objects.filter(
+            dataset__schema__user=user_id, scheduled_at__gt=since
+        )
+        .exclude(dataset=dataset)
+        .exclude(dataset__status=DataSet.REJECTED)
+        .values_list("scheduled_at", "dataset__rows")
+    )
+    streams = StreamUsage.objects.filter(
+        user=user_id, started_at__gt=since
+    ).values_list("started_at", "rows")
+    return [*jobs, *streams]
+
+
+def reserve_stream(user, rows):
+    """
+    Count a stream of ``rows`` rows against the row quota of ``user`` and
+    return whether it fits right now; streams are never deferred.
+    """
+    if rows < 1:
+        return False
+    now = timezone.now()
+    with transaction.atomic():
+        User.objects.select_for_update().filter(pk=user.pk).first()
+        if quota_start(_usage(user.pk, now), rows, now) != now:
+            return False
+        StreamUsage.objects.filter(started_at__lte=now - QUOTA_WINDOW).delete()
+        StreamUsage.objects.create(user=user, rows=rows, started_at=now)
+    return True
+
+
+def enqueue(dataset, restart=False):
+    """
+    Queue ``dataset`` for generation by a worker.
+
+    The job is scheduled for when the user's hourly row quota leaves room
+    for it, and the dataset marked queued, or deferred when that is later.
+    A dataset of no rows, or of more than the whole quota, is rejected
+    instead. With ``restart`` the job starts over with no attempts counted.
+    """
+    now = timezone.now()
+    cost = estimate_cost(get_plan(dataset.schema), dataset.rows)
+    with transaction.atomic():
+        # Serialize the quota checks of one user
+        User.objects.select_for_update().filter(pk=dataset.schema.user_id).first()
+        usage = _usage(dataset.schema.user_id, now, dataset)
+        scheduled_at = (
+            quota_start(usage, dataset.rows, now) if dataset.rows >= 1 else None
+        )
+        if scheduled_at is None:
+            job_status = GenerationJob.FAILED
+            dataset.status = DataSet.REJECTED
+            if dataset.rows < 1:
+                error = "A dataset needs at least 1 row."
+            else:
+                error = (
+                    f"{dataset.rows} rows exceed the quota of "
+                    f"{settings.FAKE_CSV_USER_ROWS_PER_HOUR} rows per hour."
+                )
+            scheduled_at = now
+        else:
+            job_status = GenerationJob.QUEUED
+            dataset.status = DataSet.QUEUED if scheduled_at <= now else DataSet.DEFERRED
+            error = ""
+        defaults = {
+            "status": job_status,
+            "worker": "",
+            "lease_expires_at": None,
+            "error": error,
+            "scheduled_at": scheduled_at,
+            "cost": cost,
+            "priority": priority(scheduled_at, cost),
+        }
+        if restart:
+            defaults["attempts"] = 0
+        job, _ = GenerationJob.objects.update_or_create(
+            dataset=dataset, defaults=defaults
+        )
+        dataset.save(update_fields=["status"])
+    return job
+
+
+def restart(dataset):
+    """
+    Queue ``dataset`` on its user's request and return whether it was.
+
+    Only datasets never queued before or in one of ``DataSet.RESTARTABLE``
+    are, so a request cannot pull a running job from under its worker or
+    replace a generated file.
+    """
+    with transaction.atomic():
+        locked = DataSet.objects.select_for_update().get(pk=dataset.pk)
+        if (
+            GenerationJob.objects.filter(dataset=locked).exists()
+            and locked.status not in DataSet.RESTARTABLE
+        ):
+            dataset.refresh_from_db()
+            return False
+        enqueue(dataset, restart=True)
+    return True
+
+
+def _claimable(now):
+    return Q(status=GenerationJob.QUEUED, scheduled_at__lte=now) | Q(
+        status=GenerationJob.RUNNING, lease_expires_at__lt=now
+    )
+
+
+def _busy_users(now):
+    """Match the users running ``FAKE_CSV_USER_MAX_RUNNING`` live jobs."""
+    return (
+        GenerationJob.objects.filter(
+            status=GenerationJob.RUNNING, lease_expires_at__gte=now
+        )
+        .values("dataset__schema__user")
+        .annotate(running=Count("pk"))
+        .filter(running__gte=settings.FAKE_CSV_USER_MAX_RUNNING)
+        .values("dataset__schema__user")
+    )
+
+
+def claim_job(worker):
+    """
+    Atomically claim the most urgent runnable job, or one whose lease has
+    expired.
+
+    Jobs are taken in ``priority`` order, i.e. shortest expected job first
+    with aging, skipping the users already running
+    ``FAKE_CSV_USER_MAX_RUNNING`` jobs. The limit is checked before the
+    claim, so workers racing for one user's jobs may briefly exceed it.
+
+    A job is claimed with a conditional UPDATE that only matches while the
+    job is still claimable, so concurrent workers can never both win it.
+    Returns the claimed job or ``None`` when the queue is empty.
+    """
+    now = timezone.now()
+    lease = timedelta(seconds=settings.FAKE_CSV_JOB_LEASE_SECONDS)
+    candidates = GenerationJob.objects.filter(_claimable(now))
+    if settings.FAKE_CSV_USER_MAX_RUNNING:
+        candidates = candidates.exclude(dataset__schema__user__in=_busy_users(now))
+    candidates = candidates.order_by("priority", "pk")
+    for job_pk in candidates.values_list("pk", flat=True)[:10]:
+        claimed = GenerationJob.objects.filter(_claimable(now), pk=job_pk).update(
+            status=GenerationJob.RUNNING,
+            worker=worker,
+            lease_expires_at=now + lease,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return GenerationJob.objects.select_related("dataset__schema").get(
+                pk=job_pk
+            )
+    return None
+
+
+def cancel(dataset):
+    """
+    Cancel the generation of ``dataset`` unless it already ended.
+
+    A waiting job is never claimed afterwards and its partial file is
+    removed at once. A worker running the job notices at its next progress
+    update, stops and removes the partial file itself. Returns whether the
+    dataset was cancelled.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        cancelled = DataSet.objects.filter(
+            pk=dataset.pk, status__in=DataSet.CANCELLABLE
+        ).update(status=DataSet.CANCELLED)
+        if not cancelled:
+            return False
+        jobs = GenerationJob.objects.filter(dataset=dataset)
+        running = jobs.filter(
+            status=GenerationJob.RUNNING, lease_expires_at__gte=now
+        ).exists()
+        jobs.filter(status__in=[GenerationJob.QUEUED, GenerationJob.RUNNING]).update(
+            status=GenerationJob.CANCELLED
+        )
+        if not running:
+            _discard_checkpoint(dataset)
+            DataSet.objects.filter(pk=dataset.pk).update(checkpoint=None)
+    dataset.status = DataSet.CANCELLED
+    return True
+
+
+def _stopped(job):
+    """Raise ``Cancelled`` or ``LeaseLost`` for a job no longer running here."""
+    if GenerationJob.objects.filter(pk=job.pk, status=GenerationJob.CANCELLED).exists():
+        raise Cancelled(f"Job {job.pk} was cancelled.")
+    raise LeaseLost(f"Job {job.pk} was claimed by another worker.")
+
+
+def renew_lease(job):
+    """
+    Extend the lease of ``job``; raise ``LeaseLost`` if it was taken over,
+    or ``Cancelled`` if it was cancelled.
+    """
+    lease_expires_at = timezone.now() + timedelta(
+        seconds=settings.FAKE_CSV_JOB_LEASE_SECONDS
+    )
+    renewed = GenerationJob.objects.filter(
+        pk=job.pk, status=GenerationJob.RUNNING, worker=job.worker
+    ).update(lease_expires_at=lease_expires_at)
+    if not renewed:
+        _stopped(job)
+    job.lease_expires_at = lease_expires_at
+
+
+def _on_chunk(job):
+    """
+    Build the per-chunk callback of ``job``.
+
+    It records progress at most every ``FAKE_CSV_PROGRESS_INTERVAL``
+    seconds and renews the lease once half of it has elapsed, so most
+    chunks only cost a clock read. The progress update only matches while
+    the job is still running on this worker, which makes it the check for
+    cancellation as well.
+    """
+    half_lease = timedelta(seconds=settings.FAKE_CSV_JOB_LEASE_SECONDS / 2)
+    interval = settings.FAKE_CSV_PROGRESS_INTERVAL
+    next_progress = time.monotonic() + interval
+
+    def on_chunk(rows_done, bytes_written):
+        nonlocal next_progress
+        if time.monotonic() >= next_progress:
+            updated = DataSet.objects.filter(
+                pk=job.dataset.pk,
+                job__status=GenerationJob.RUNNING,
+                job__worker=job.worker,
+            ).update(
+                rows_done=rows_done,
+                bytes_written=bytes_written,
+                progress_updated_at=timezone.now(),
+            )
+            if not updated:
+                _stopped(job)
+            next_progress = time.monotonic() + interval
+            if job.lease_expires_at - timezone.now() < half_lease:
+                renew_lease(job)
+
+    return on_chunk
+
+
+def _on_checkpoint(job):
+    """
+    Build the callback saving the checkpoints of ``job``.
+
+    The lease is renewed first, so a worker that lost the job stops
+    before it can record a checkpoint over the new owner's.
+    """
+
+    def on_checkpoint(checkpoint):
+        renew_lease(job)
+        DataSet.objects.filter(pk=job.dataset.pk).update(
+            checkpoint=checkpoint,
+            rows_done=checkpoint["rows"],
+            bytes_written=checkpoint["offset"],
+            progress_updated_at=timezone.now(),
+        )
+
+    return on_checkpoint
+
+
+def _discard_checkpoint(dataset):
+    """Remove the partial file recorded by the latest checkpoint of ``dataset``."""
+    checkpoint = (
+        DataSet.objects.filter(pk=dataset.pk)
+        .values_list("checkpoint", flat=True)
+        .first()
+    )
+    if checkpoint:
+        path = os.path.join(settings.MEDIA_ROOT, checkpoint["path"])
+        if os.path.exists(path):
+            os.remove(path)
+    dataset.checkpoint = None
+
+
+def _finish(job, job_status, dataset_status, error=""):
+    with transaction.atomic():
+        GenerationJob.objects.filter(pk=job.pk, worker=job.worker).update(
+            status=job_status, lease_expires_at=None, error=error
+        )
+        job.dataset.status = dataset_status
+        job.dataset.progress_updated_at = timezone.now()
+        job.dataset.save(
+            update_fields=[
+                "status",
+                "file",
+                "rows_done",
+                "bytes_written",
+                "progress_updated_at",
+                "profile",
+                "checkpoint",
+            ]
+        )
+
+
+def run_job(job):
+    """
+    Generate the dataset of a claimed ``job`` and record the outcome.
+
+    Uncompressed CSV datasets are checkpointed after every shard, and a job
+    reclaimed from a dead worker continues from the last checkpoint. A
+    cancelled job stops at its next progress update and leaves no file.
+    """
+    dataset = job.dataset
+    if job.attempts > settings.FAKE_CSV_JOB_MAX_ATTEMPTS:
+        _discard_checkpoint(dataset)
+        _finish(
+            job,
+            GenerationJob.FAILED,
+            DataSet.FAILED,
+            error=f"Gave up after {job.attempts - 1} attempts.",
+        )
+        return
+
+    dataset.status = DataSet.PROCESSING
+    dataset.progress_updated_at = timezone.now()
+    checkpoint = dataset.checkpoint if dataset.resumable else None
+    if checkpoint is None or dataset.started_at is None:
+        dataset.started_at = dataset.progress_updated_at
+    if checkpoint is None:
+        dataset.rows_done = dataset.bytes_written = 0
+    dataset.save(
+        update_fields=[
+            "status",
+            "started_at",
+            "progress_updated_at",
+            "rows_done",
+            "bytes_written",
+        ]
+    )
+    profile = {} if settings.FAKE_CSV_PROFILE_EVERY else None
+    try:
+        filepath = generate_cached(
+            dataset.schema,
+            dataset.rows,
+            seed=dataset.seed,
+            on_chunk=_on_chunk(job),
+            compression=dataset.compression,
+            profile=profile,
+            checkpoint=checkpoint,
+            on_checkpoint=_on_checkpoint(job) if dataset.resumable else None,
+        )
+    except LeaseLost:
+        return
+    except Cancelled:
+        _discard_checkpoint(dataset)
+        _finish(job, GenerationJob.CANCELLED, DataSet.CANCELLED)
+        return
+    except UniqueExhausted as error:
+        _discard_checkpoint(dataset)
+        _finish(job, GenerationJob.FAILED, DataSet.FAILED, error=str(error))
+        return
+    except Exception:
+        _discard_checkpoint(dataset)
+        _finish(job, GenerationJob.FAILED, DataSet.FAILED, error=traceback.format_exc())
+        return
+    dataset.file = os.path.relpath(filepath, settings.MEDIA_ROOT)
+    dataset.rows_done = dataset.rows
+    dataset.bytes_written = os.path.getsize(filepath)
+    dataset.profile = profile or None
+    dataset.checkpoint = None
+    _finish(job, GenerationJob.DONE, DataSet.READY)
+
+
+def warm_up():
+    """Pool a Faker for every locale in use before the first job is claimed."""
+    locales = DataSchema.objects.values_list("locale", flat=True).distinct()
+    warm([settings.FAKE_CSV_LOCALE, *locales])
+
+
+def reclaim_stale():
+    """
+    Queue again the datasets left processing by a worker that died.
+
+    A dataset is stale when its progress has not moved for a whole lease
+    and no live lease covers its job, e.g. when the job is missing or was
+    marked finished without the dataset. Requeued datasets resume from
+    their checkpoint. Returns the number of datasets requeued.
+    """
+    now = timezone.now()
+    stale = (
+        DataSet.objects.filter(status=DataSet.PROCESSING)
+        .filter(
+            Q(progress_updated_at__isnull=True)
+            | Q(
+                progress_updated_at__lt=now
+                - timedelta(seconds=settings.FAKE_CSV_JOB_LEASE_SECONDS)
+            )
+        )
+        .exclude(job__status=GenerationJob.RUNNING, job__lease_expires_at__gte=now)
+    )
+    datasets = list(stale)
+    for dataset in datasets:
+        enqueue(dataset)
+    return len(datasets)
+
+
+def work(worker, poll_interval=None, once=False):
+    """
+    Claim and run jobs until interrupted, sleeping while the queue is empty.
+
+    Stale processing datasets are looked for at start and then every half
+    lease.
+    """
+    if poll_interval is None:
+        poll_interval = settings.FAKE_CSV_JOB_POLL_INTERVAL
+    next_reclaim = 0
+    while True:
+        if time.monotonic() >= next_reclaim:
+            reclaim_stale()
+            next_reclaim = time.monotonic() + settings.FAKE_CSV_JOB_LEASE_SECONDS / 2
+        job = claim_job(worker)
+        if job is not None:
+            run_job(job)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,69 @@
+import json
+
+import faker
+from django.core.management.base import BaseCommand, CommandError
+
+from fake_csv.benchmarks import SUITES, find_regressions
+
+
+class Command(BaseCommand):
+    help = "Benchmark the dataset generation engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--suite",
+            action="append",
+            choices=sorted(SUITES),
+            help="Suite to run; may be repeated. Runs every suite by default.",
+        )
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=10000,
+            help=(
+                "Number of rows generated by each benchmark case; the largest "
+                "row count of the scale suite."
+            ),
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file.")
+        parser.add_argument(
+            "--baseline",
+            help="JSON file of an earlier run to compare the results with.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help=(
+                "Fail when a throughput falls by more than this fraction "
+                "below the baseline."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        results = []
+        for suite in options["suite"] or sorted(SUITES):
+            for result in SUITES[suite](options["rows"]):
+                results.append(result)
+                self.stdout.write(
+                    "  ".join(f"{key}={value}" for key, value in result.items())
+                )
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(
+                    {
+                        "rows": options["rows"],
+                        "faker": faker.VERSION,
+                        "results": results,
+                    },
+                    file,
+                    indent=2,
+                )
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)["results"]
+            regressions = find_regressions(baseline, results, options["threshold"])
+            if regressions:
+                raise CommandError(
+                    "Performance regressions:\n" + "\n".join(regressions)
+                )
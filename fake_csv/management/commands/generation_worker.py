@@ -0,0 +1,62 @@
+import multiprocessing
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def run_worker(index, poll_interval, once):
+    django.setup()
+    from fake_csv.jobs import warm_up, work, worker_name
+
+    warm_up()
+    try:
+        work(worker_name(index), poll_interval=poll_interval, once=once)
+    except KeyboardInterrupt:
+        pass
+
+
+class Command(BaseCommand):
+    help = "Run a pool of worker processes that generate queued datasets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.FAKE_CSV_WORKERS,
+            help="Number of worker processes to run.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.FAKE_CSV_JOB_POLL_INTERVAL,
+            help="Seconds to wait before polling an empty queue again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(
+                target=run_worker,
+                args=(index, options["poll_interval"], options["once"]),
+                name=f"generation-worker-{index}",
+            )
+            for index in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(f"Started {workers} generation worker(s).")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.join()
+        self.stdout.write("Generation workers stopped.")
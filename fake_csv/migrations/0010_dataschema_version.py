@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0009_dataschema_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataschema",
+            name="version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def normalize_statuses(apps, schema_editor):
+    DataSet = apps.get_model("fake_csv", "DataSet")
+    DataSet.objects.filter(status="PROCESSING").update(status="Processing")
+    DataSet.objects.filter(status="READY").update(status="Ready")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0010_dataschema_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dataset",
+            name="file",
+            field=models.FileField(null=True, upload_to="media/"),
+        ),
+        migrations.AlterField(
+            model_name="dataset",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Queued", "Queued"),
+                    ("Processing", "Processing"),
+                    ("Ready", "Ready"),
+                    ("Failed", "Failed"),
+                ],
+                default="Queued",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(normalize_statuses, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="GenerationJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("worker", models.CharField(blank=True, max_length=255)),
+                ("lease_expires_at", models.DateTimeField(blank=True, null=True)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "dataset",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="job",
+                        to="fake_csv.dataset",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="generationjob",
+            index=models.Index(
+                fields=["status", "created_at"], name="fake_csv_ge_status_f259f7_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0011_generationjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="seed",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0012_dataset_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="compression",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("", "None"),
+                    ("gzip", "gzip"),
+                    ("zip", "zip"),
+                    ("zstd", "zstd"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0013_dataset_compression"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataschema",
+            name="file_format",
+            field=models.CharField(
+                choices=[
+                    ("csv", "CSV"),
+                    ("parquet", "Parquet"),
+                    ("arrow", "Arrow IPC"),
+                ],
+                default="csv",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0014_dataschema_file_format"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="bytes_written",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="progress_updated_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="rows_done",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
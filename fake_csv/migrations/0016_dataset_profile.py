@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0015_dataset_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="profile",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0016_dataset_profile"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="dataschema",
+            index=models.Index(
+                fields=["user", "created_at"], name="fake_csv_da_user_id_86d5d0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="dataset",
+            index=models.Index(
+                fields=["schema", "created_at"], name="fake_csv_da_schema__f67e75_idx"
+            ),
+        ),
+    ]
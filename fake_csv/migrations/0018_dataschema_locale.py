@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:22
+
+from django.db import migrations, models
+import fake_csv.models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0017_list_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataschema",
+            name="locale",
+            field=models.CharField(
+                default=fake_csv.models.default_locale, max_length=20
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0018_dataschema_locale"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="checkpoint",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:29
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0019_dataset_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="generationjob",
+            name="cost",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="priority",
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name="generationjob",
+            name="scheduled_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="dataset",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Queued", "Queued"),
+                    ("Deferred", "Deferred"),
+                    ("Processing", "Processing"),
+                    ("Ready", "Ready"),
+                    ("Failed", "Failed"),
+                    ("Rejected", "Rejected"),
+                ],
+                default="Queued",
+                max_length=20,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="generationjob",
+            index=models.Index(
+                fields=["status", "priority"], name="fake_csv_ge_status_a5c3cf_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0020_job_scheduling"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dataset",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("Queued", "Queued"),
+                    ("Deferred", "Deferred"),
+                    ("Processing", "Processing"),
+                    ("Ready", "Ready"),
+                    ("Failed", "Failed"),
+                    ("Rejected", "Rejected"),
+                    ("Cancelled", "Cancelled"),
+                ],
+                default="Queued",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="generationjob",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("running", "Running"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                    ("cancelled", "Cancelled"),
+                ],
+                default="queued",
+                max_length=20,
+            ),
+        ),
+    ]
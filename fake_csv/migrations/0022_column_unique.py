@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0021_cancelled_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="column",
+            name="unique",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.1.7 on 2026-10-18 10:32
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("fake_csv", "0023_streamusage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dataset",
+            name="rows",
+            field=models.IntegerField(
+                validators=[django.core.validators.MinValueValidator(1)]
+            ),
+        ),
+    ]
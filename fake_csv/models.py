@@ -1,19 +1,77 @@
 import os
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from faker.config import AVAILABLE_LOCALES
+
+from .columnar import check_options, pyarrow
+from .compression import zstandard
+
+
+def default_locale():
+    return settings.FAKE_CSV_LOCALE
+
+
+def _count(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class DataSchemaQuerySet(models.QuerySet):
+    def with_counts(self):
+        """
+        Annotate ``columns_count`` and ``datasets_count``.
+
+        Each count is a correlated subquery, so the two relations are not
+        joined into one row per column and dataset pair.
+        """
+        return self.annotate(
+            columns_count=_count(Column.objects.all(), "schema"),
+            datasets_count=_count(DataSet.objects.all(), "schema"),
+        )
 
 
 class DataSchema(models.Model):
     COLUMN_SEPARATORS = ((",", "Comma (,)"), (";", "Semicolon (;)"))
 
     STRING_CHARACTER = (("“", "Double-quote (“)"), ("‘", "Apostrophes (‘)"))
+    FILE_FORMATS = (("csv", "CSV"), ("parquet", "Parquet"), ("arrow", "Arrow IPC"))
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     column_separator = models.CharField(choices=COLUMN_SEPARATORS, max_length=1)
     string_character = models.CharField(choices=STRING_CHARACTER, max_length=1)
+    file_format = models.CharField(choices=FILE_FORMATS, max_length=10, default="csv")
+    locale = models.CharField(max_length=20, default=default_locale)
     created_at = models.DateTimeField(auto_now_add=True)
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = DataSchemaQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_at"])]
+
+    def clean(self):
+        super().clean()
+        if self.file_format != "csv" and pyarrow is None:
+            raise ValidationError(
+                {"file_format": "Columnar formats are not available on this server."}
+            )
+        if self.locale not in AVAILABLE_LOCALES:
+            raise ValidationError({"locale": f"Unknown locale {self.locale!r}."})
 
 
 class Column(models.Model):
@@ -36,6 +94,7 @@ class Column(models.Model):
     data_type = models.CharField(choices=TYPES, max_length=255)
     range_from = models.IntegerField(null=True, blank=True)
     range_to = models.IntegerField(null=True, blank=True)
+    unique = models.BooleanField(default=False)
     order = models.IntegerField()
 
     def clean(self):
@@ -47,14 +106,138 @@ class Column(models.Model):
 
 
 class DataSet(models.Model):
+    QUEUED = "Queued"
+    DEFERRED = "Deferred"
+    PROCESSING = "Processing"
+    READY = "Ready"
+    FAILED = "Failed"
+    REJECTED = "Rejected"
+    CANCELLED = "Cancelled"
+    STATUSES = (
+        (QUEUED, "Queued"),
+        (DEFERRED, "Deferred"),
+        (PROCESSING, "Processing"),
+        (READY, "Ready"),
+        (FAILED, "Failed"),
+        (REJECTED, "Rejected"),
+        (CANCELLED, "Cancelled"),
+    )
+    CANCELLABLE = (QUEUED, DEFERRED, PROCESSING)
+    # Finished without a file, so the user may generate them again
+    RESTARTABLE = (FAILED, REJECTED, CANCELLED)
+    COMPRESSIONS = (
+        ("", "None"),
+        ("gzip", "gzip"),
+        ("zip", "zip"),
+        ("zstd", "zstd"),
+    )
+
     schema = models.ForeignKey(
         DataSchema, on_delete=models.CASCADE, related_name="datasets"
     )
-    rows = models.IntegerField()
-    status = models.CharField(
-        max_length=20,
-        choices=(("Processing", "Processing"), ("Ready", "Ready")),
-        default="PROCESSING",
+    rows = models.IntegerField(validators=[MinValueValidator(1)])
+    seed = models.BigIntegerField(null=True, blank=True)
+    compression = models.CharField(
+        max_length=10, choices=COMPRESSIONS, blank=True, default=""
     )
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
     file = models.FileField(upload_to=os.path.join("media/"), null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    progress_updated_at = models.DateTimeField(null=True, blank=True)
+    rows_done = models.BigIntegerField(default=0)
+    bytes_written = models.BigIntegerField(default=0)
+    profile = models.JSONField(null=True, blank=True, editable=False)
+    checkpoint = models.JSONField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["schema", "created_at"])]
+
+    @property
+    def cancellable(self):
+        return self.status in self.CANCELLABLE
+
+    @property
+    def resumable(self):
+        """Whether generation of this dataset can be checkpointed and resumed."""
+        return self.schema.file_format == "csv" and not self.compression
+
+    def progress(self):
+        """Rows and bytes written so far, with the throughput and ETA they imply."""
+        progress = {
+            "rows": self.rows,
+            "rows_done": self.rows_done,
+            "percent": round(100 * self.rows_done / self.rows, 1) if self.rows else 0,
+            "bytes_written": self.bytes_written,
+            "rows_per_sec": None,
+            "bytes_per_sec": None,
+            "eta_seconds": None,
+        }
+        if self.started_at and self.progress_updated_at:
+            elapsed = (self.progress_updated_at - self.started_at).total_seconds()
+            if elapsed > 0 and self.rows_done:
+                rows_per_sec = self.rows_done / elapsed
+                progress["rows_per_sec"] = round(rows_per_sec)
+                progress["bytes_per_sec"] = round(self.bytes_written / elapsed)
+                if self.status == self.PROCESSING:
+                    progress["eta_seconds"] = round(
+                        (self.rows - self.rows_done) / rows_per_sec, 1
+                    )
+        return progress
+
+    def clean(self):
+        super().clean()
+        if self.compression == "zstd" and zstandard is None:
+            raise ValidationError(
+                {"compression": "zstd compression is not available on this server."}
+            )
+        if self.schema_id and self.schema.file_format != "csv":
+            try:
+                check_options(self.schema.file_format, self.compression)
+            except ValueError as error:
+                raise ValidationError({"compression": str(error)})
+
+
+class GenerationJob(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUSES = (
+        (QUEUED, "Queued"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+    )
+
+    dataset = models.OneToOneField(
+        DataSet, on_delete=models.CASCADE, related_name="job"
+    )
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    scheduled_at = models.DateTimeField(default=timezone.now)
+    cost = models.FloatField(default=0)
+    priority = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+            models.Index(fields=["status", "priority"]),
+        ]
+
+
+class StreamUsage(models.Model):
+    """Rows a user streamed, counted against the hourly row quota."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    rows = models.IntegerField()
+    started_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "started_at"])]
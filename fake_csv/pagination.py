@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.http import Http404
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(obj):
+    """Encode the ``(created_at, pk)`` position of ``obj`` for a query string."""
+    return f"{(obj.created_at - EPOCH) // MICROSECOND}-{obj.pk}"
+
+
+def decode_cursor(cursor):
+    """Return the ``(created_at, pk)`` pair of ``cursor``; raise 404 if invalid."""
+    try:
+        micros, pk = (int(part) for part in cursor.split("-"))
+        return EPOCH + micros * MICROSECOND, pk
+    except (ValueError, OverflowError):
+        raise Http404("Invalid page cursor.")
+
+
+class KeysetPage:
+    """
+    One page of a list ordered on ``(created_at, pk)``.
+
+    The neighbouring pages are addressed by the cursors of the first and
+    last rows, so fetching any page is an index range scan rather than an
+    OFFSET that skips every earlier row. ``total`` is an approximate row
+    count, or ``None`` when totals are disabled.
+    """
+
+    def __init__(self, object_list, has_previous, has_next, total=None):
+        self.object_list = object_list
+        self.has_previous = has_previous
+        self.has_next = has_next
+        self.total = total
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0])
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1])
+
+
+def _beyond(cursor, descending):
+    """Match the rows after the position of ``cursor`` in list order."""
+    created_at, pk = decode_cursor(cursor)
+    if descending:
+        return Q(created_at__lte=created_at) & (
+            Q(created_at__lt=created_at) | Q(pk__lt=pk)
+        )
+    return Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(pk__gt=pk))
+
+
+def _order(descending):
+    return ["-created_at", "-pk"] if descending else ["created_at", "pk"]
+
+
+def approximate_total(queryset, cache_key):
+    """
+    Count ``queryset``, reusing the count for ``FAKE_CSV_PAGE_TOTAL_TTL``
+    seconds; returns ``None`` when the setting is 0.
+    """
+    if not settings.FAKE_CSV_PAGE_TOTAL_TTL:
+        return None
+    key = f"fake_csv:total:{cache_key}"
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, settings.FAKE_CSV_PAGE_TOTAL_TTL)
+    return total
+
+
+def paginate_keyset(queryset, params, per_page, descending=False, cache_key=None):
+    """
+    Return the ``KeysetPage`` of ``queryset`` selected by the ``after`` or
+    ``before`` cursor in ``params``, ordered on ``(created_at, pk)``.
+
+    Pass a ``cache_key`` to include an approximate total.
+    """
+    if params.get("before"):
+        # Walk backwards from the cursor and restore list order afterwards
+        rows = list(
+            queryset.filter(_beyond(params["before"], not descending)).order_by(
+                *_order(not descending)
+            )[: per_page + 1]
+        )
+        has_previous = len(rows) > per_page
+        has_next = True
+        object_list = rows[:per_page][::-1]
+    else:
+        if params.get("after"):
+            queryset_page = queryset.filter(_beyond(params["after"], descending))
+        else:
+            queryset_page = queryset
+        rows = list(queryset_page.order_by(*_order(descending))[: per_page + 1])
+        has_previous = bool(params.get("after"))
+        has_next = len(rows) > per_page
+        object_list = rows[:per_page]
+    total = None if cache_key is None else approximate_total(queryset, cache_key)
+    return KeysetPage(object_list, has_previous, has_next, total)
@@ -0,0 +1,155 @@
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+from collections import OrderedDict
+
+from django.conf import settings
+from faker import Faker
+
+from .compiler import ENGINE_VERSION, GENERATORS
+
+POOLED_TYPES = (
+    "Full name",
+    "Job",
+    "Email",
+    "Domain name",
+    "Phone number",
+    "Company name",
+    "Address",
+)
+
+MAGIC = b"FCSVPOOL1"
+HEADER = struct.Struct("<I")
+
+_resident = OrderedDict()
+
+
+class ValuePool:
+    """
+    Read-only, memory-mapped corpus of pre-generated values.
+
+    The file holds ``MAGIC``, the value count, ``count + 1`` little-endian
+    uint32 offsets and the UTF-8 encoded values back to back, so a value
+    is decoded straight from the mapping without loading the whole pool.
+    Pools pickle as their path, which lets shard processes map them too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as pool_file:
+            self._mmap = mmap.mmap(pool_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a value pool.")
+        (self.count,) = HEADER.unpack_from(self._mmap, len(MAGIC))
+        offsets_start = len(MAGIC) + HEADER.size
+        self._data_start = offsets_start + 4 * (self.count + 1)
+        self._offsets = memoryview(self._mmap)[offsets_start : self._data_start].cast(
+            "I"
+        )
+
+    def __reduce__(self):
+        return self.__class__, (self.path,)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        start = self._data_start + self._offsets[index]
+        end = self._data_start + self._offsets[index + 1]
+        return self._mmap[start:end].decode()
+
+    def sample(self, rng, k):
+        """Return ``k`` values drawn uniformly at random with ``rng``."""
+        return [self[index] for index in rng.choices(range(self.count), k=k)]
+
+    def close(self):
+        self._offsets.release()
+        self._mmap.close()
+
+
+def write_pool(path, values):
+    """Write ``values`` to ``path`` in the value pool format."""
+    encoded = [value.encode() for value in values]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    with open(path, "wb") as pool_file:
+        pool_file.write(MAGIC)
+        pool_file.write(HEADER.pack(len(encoded)))
+        pool_file.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        for value in encoded:
+            pool_file.write(value)
+
+
+def build_pool(path, data_type, locale, size):
+    """
+    Generate ``size`` values of ``data_type`` in ``locale`` into ``path``.
+
+    The Faker used is seeded from the data type and locale, so rebuilding
+    a pool with the same Faker version yields the same values. The pool is
+    written to a temporary file first and moved into place atomically.
+    """
+    fake = Faker(locale)
+    digest = hashlib.blake2b(f"{data_type}:{locale}".encode(), digest_size=8)
+    fake.seed_instance(int.from_bytes(digest.digest(), "big"))
+    generate = GENERATORS[data_type](fake, None, None)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write_pool(temp_path, (generate() for _ in range(size)))
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def pool_path(data_type, locale):
+    return os.path.join(
+        settings.FAKE_CSV_POOL_DIR,
+        f"{locale}-{data_type.replace(' ', '_')}-{ENGINE_VERSION}.pool",
+    )
+
+
+def _is_stale(pool):
+    if not os.path.exists(pool.path):
+        return True
+    return len(pool) != settings.FAKE_CSV_POOL_SIZE
+
+
+def get_pool(data_type, locale):
+    """
+    Return the resident pool of ``data_type`` in ``locale``.
+
+    Missing pools are built on first use, and pools built with a different
+    ``FAKE_CSV_POOL_SIZE`` are rebuilt. Pools are never refreshed otherwise:
+    their values only depend on the data type, locale, size, Faker version
+    and ``ENGINE_VERSION``, which is what lets seeded pooled datasets be
+    reproduced and cached. At most ``FAKE_CSV_POOL_MAX_RESIDENT``
+    pools stay resident; the least recently used one is dropped first and
+    unmapped once no generator refers to it any more.
+    """
+    path = pool_path(data_type, locale)
+    pool = _resident.pop(path, None)
+    if pool is None and os.path.exists(path):
+        pool = ValuePool(path)
+    if pool is None or _is_stale(pool):
+        build_pool(path, data_type, locale, settings.FAKE_CSV_POOL_SIZE)
+        pool = ValuePool(path)
+    _resident[path] = pool
+    while len(_resident) > settings.FAKE_CSV_POOL_MAX_RESIDENT:
+        _resident.popitem(last=False)
+    return pool
+
+
+def get_pools(plan, locale):
+    """Return the pools needed by ``plan``, keyed by data type."""
+    return {
+        data_type: get_pool(data_type, locale)
+        for (_, data_type, _, _), unique in zip(plan.columns, plan.unique)
+        if data_type in POOLED_TYPES and not unique
+    }
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import bind_shard, shard_config
+
+# Seed of every preview, so reloading a page shows the same rows
+PREVIEW_SEED = 0
+
+MAX_PREVIEW_ROWS = 100
+
+
+def generate_preview(schema, rows):
+    """
+    Generate ``rows`` rows of ``schema`` in memory as lists of strings.
+
+    Values are drawn live from Faker rather than value pools, which may
+    need building first, and nothing is written to disk.
+    """
+    config = shard_config(schema, pooled=False, rows=rows)
+    with bind_shard(config, PREVIEW_SEED) as batches:
+        columns = [batch(rows) for batch in batches]
+    return {
+        "fieldnames": config.plan.fieldnames,
+        "rows": [list(map(str, row)) for row in zip(*columns)] if columns else [],
+    }
+
+
+def get_preview(schema, rows):
+    """
+    Return the preview of ``schema``, cached for ``FAKE_CSV_PREVIEW_TTL``
+    seconds.
+
+    The cache key holds the schema's version stamp, so editing the schema
+    invalidates every cached preview of it.
+    """
+    key = f"fake_csv:preview:{schema.pk}:{schema.version}:{rows}"
+    preview = cache.get(key)
+    if preview is None:
+        preview = generate_preview(schema, rows)
+        cache.set(key, preview, settings.FAKE_CSV_PREVIEW_TTL)
+    return preview
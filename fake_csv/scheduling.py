@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
+
+# Approximate microseconds to generate and write one value of each type,
+# measured with ``manage.py benchmark --suite types``
+COLUMN_COSTS = {
+    "Full name": 230,
+    "Job": 8,
+    "Email": 225,
+    "Domain name": 400,
+    "Phone number": 32,
+    "Company name": 280,
+    "Integer": 9,
+    "Address": 260,
+    "Date": 14,
+}
+
+# Text costs per sentence, drawn between its range bounds
+TEXT_SENTENCE_COST = 1.2
+
+ROW_COST = 2
+
+QUOTA_WINDOW = timedelta(hours=1)
+
+
+def estimate_cost(plan, rows):
+    """Estimate the seconds needed to generate ``rows`` rows of ``plan``."""
+    row_cost = ROW_COST
+    for _, data_type, range_from, range_to in plan.columns:
+        if data_type == "Text":
+            row_cost += TEXT_SENTENCE_COST * (range_from + range_to) / 2
+        else:
+            row_cost += COLUMN_COSTS[data_type]
+    return rows * row_cost / 10**6
+
+
+def priority(scheduled_at, cost):
+    """
+    Return the claim priority of a job, lowest first.
+
+    Jobs are ordered by the time they become runnable plus their expected
+    cost weighted by ``FAKE_CSV_SCHEDULER_COST_WEIGHT``, so a small job
+    overtakes a large one queued shortly before it, but a job that waited
+    long enough is run before any job queued after it: large jobs are
+    never starved.
+    """
+    return scheduled_at.timestamp() + cost * settings.FAKE_CSV_SCHEDULER_COST_WEIGHT
+
+
+def quota_start(usage, rows, now):
+    """
+    Return when a job of ``rows`` rows fits the hourly row quota, or ``None``
+    if it never does.
+
+    ``usage`` holds the ``(scheduled_at, rows)`` pairs of the user's jobs
+    scheduled in the last hour or later. A job is never scheduled before
+    one already deferred, and is deferred until the rows scheduled in the
+    hour before its start leave room for it.
+    """
+    quota = settings.FAKE_CSV_USER_ROWS_PER_HOUR
+    if not quota:
+        return now
+    if rows > quota:
+        return None
+    usage = sorted(usage)
+    start = max([now, *(scheduled_at for scheduled_at, _ in usage)])
+    while True:
+        window = [
+            (scheduled_at, used)
+            for scheduled_at, used in usage
+            if start - QUOTA_WINDOW < scheduled_at <= start
+        ]
+        if sum(used for _, used in window) + rows <= quota:
+            return start
+        start = window[0][0] + QUOTA_WINDOW
@@ -1,3 +1,1264 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from itertools import compress
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache as django_cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+
+from . import (
+    batches,
+    benchmarks,
+    cache,
+    columnar,
+    compiler,
+    compression,
+    fakers,
+    preview,
+    scheduling,
+    unique,
+)
+from .compiler import get_plan, invalidate_plan
+from .jobs import (
+    _on_chunk,
+    cancel,
+    claim_job,
+    enqueue,
+    reclaim_stale,
+    reserve_stream,
+    run_job,
+)
+from .models import Column, DataSchema, DataSet, GenerationJob, StreamUsage
+from .pagination import paginate_keyset
+from .pools import get_pool
+from .utils import ShardConfig, chunk_writer, generate_csv, iter_csv
+from .views import DatasetView
+
+
+class SchemaTestMixin:
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username="user", password="password")
+        self.schema = DataSchema.objects.create(
+            user=self.user,
+            name="People",
+            column_separator=",",
+            string_character='"',
+        )
+        Column.objects.create(
+            schema=self.schema,
+            name="age",
+            data_type="Integer",
+            range_from=18,
+            range_to=99,
+            order=2,
+        )
+        Column.objects.create(
+            schema=self.schema, name="name", data_type="Full name", order=1
+        )
+        self.addCleanup(compiler._plans.clear)
+        self.addCleanup(django_cache.clear)
+
+
+class GenerateCsvTests(SchemaTestMixin, TestCase):
+    def test_writes_header_and_rows(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            filepath = generate_csv(self.schema, 25)
+        with open(filepath, newline="") as csvfile:
+            rows = list(csv.reader(csvfile))
+        self.assertEqual(rows[0], ["name", "age"])
+        self.assertEqual(len(rows), 26)
+        self.assertTrue(all(18 <= int(row[1]) <= 99 for row in rows[1:]))
+
+    @override_settings(FAKE_CSV_CHUNK_SIZE=50)
+    def test_peak_memory_does_not_grow_with_rows(self):
+        small, large = {}, {}
+        with override_settings(MEDIA_ROOT=self.media_root):
+            generate_csv(self.schema, 500, stats=small)
+            generate_csv(self.schema, 5000, stats=large)
+        self.assertLess(large["peak_memory"], small["peak_memory"] * 1.5)
+
+    @override_settings(FAKE_CSV_SHARD_ROWS=40, FAKE_CSV_CHUNK_SIZE=15)
+    def test_seeded_output_does_not_depend_on_worker_count(self):
+        contents = []
+        for workers in (1, 3):
+            with override_settings(
+                MEDIA_ROOT=self.media_root, FAKE_CSV_PARALLEL_WORKERS=workers
+            ):
+                filepath = generate_csv(self.schema, 130, seed=42)
+            with open(filepath, newline="") as csvfile:
+                contents.append(csvfile.read())
+        self.assertEqual(contents[0], contents[1])
+        self.assertEqual(len(contents[0].splitlines()), 131)
+        self.assertEqual(len(os.listdir(self.media_root)), 2)
+
+    @override_settings(
+        FAKE_CSV_SHARD_ROWS=40, FAKE_CSV_CHUNK_SIZE=15, FAKE_CSV_PROFILE_EVERY=2
+    )
+    def test_profiling_samples_chunks_without_changing_output(self):
+        contents = []
+        for workers, profile in ((1, None), (1, {}), (3, {})):
+            with override_settings(
+                MEDIA_ROOT=self.media_root, FAKE_CSV_PARALLEL_WORKERS=workers
+            ):
+                filepath = generate_csv(self.schema, 130, seed=42, profile=profile)
+            with open(filepath, newline="") as csvfile:
+                contents.append(csvfile.read())
+            if profile is not None:
+                self.assertEqual(profile["chunks"], 10)
+                self.assertGreaterEqual(profile["sampled_chunks"], 5)
+                self.assertEqual(
+                    [column["name"] for column in profile["columns"]], ["name", "age"]
+                )
+                self.assertGreater(profile["columns"][0]["sanitize_seconds"], 0)
+                self.assertEqual(profile["columns"][1]["sanitize_seconds"], 0)
+        self.assertEqual(len(set(contents)), 1)
+
+    def test_run_job_stores_profile_shown_in_admin(self):
+        dataset = DataSet.objects.create(schema=self.schema, rows=10)
+        enqueue(dataset)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(claim_job("worker"))
+        dataset.refresh_from_db()
+        self.assertEqual(dataset.profile["sampled_rows"], 10)
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("admin:fake_csv_dataset_change", args=[dataset.pk])
+        )
+        self.assertContains(response, "Provider µs/row")
+        response = self.client.get(reverse("admin:fake_csv_dataset_changelist"))
+        self.assertContains(response, "name (Full name")
+
+
+@override_settings(FAKE_CSV_PAGE_TOTAL_TTL=0)
+class QueryCountTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def assert_constant_queries(self, url, add_rows, queries):
+        for _ in range(2):
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            add_rows()
+
+    def test_schemas_list(self):
+        def add_schemas():
+            for index in range(3):
+                schema = DataSchema.objects.create(
+                    user=self.user, name=f"Schema {index}"
+                )
+                Column.objects.create(
+                    schema=schema, name="name", data_type="Full name", order=1
+                )
+                DataSet.objects.create(schema=schema, rows=10)
+
+        self.assert_constant_queries(reverse("schemas:schemas-list"), add_schemas, 3)
+        schema = DataSchema.objects.with_counts().get(pk=self.schema.pk)
+        self.assertEqual((schema.columns_count, schema.datasets_count), (2, 0))
+
+    def test_dataset_detail(self):
+        def add_datasets():
+            for _ in range(5):
+                DataSet.objects.create(
+                    schema=self.schema, rows=10, file="media/people.csv"
+                )
+
+        self.assert_constant_queries(
+            reverse("schemas:datasets", kwargs={"pk": self.schema.pk}),
+            add_datasets,
+            5,
+        )
+
+
+class SaveColumnsTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def post_schema(self, url, columns, initial=0, locale="en_US"):
+        data = {
+            "name": "People",
+            "column_separator": ",",
+            "string_character": "“",
+            "file_format": "csv",
+            "locale": locale,
+            "form-TOTAL_FORMS": len(columns),
+            "form-INITIAL_FORMS": initial,
+        }
+        for index, column in enumerate(columns):
+            for field, value in column.items():
+                data[f"form-{index}-{field}"] = value
+        return self.client.post(url, data)
+
+    def edit(self, columns):
+        return self.post_schema(
+            reverse("schemas:schema-edit", kwargs={"pk": self.schema.pk}),
+            columns,
+            initial=sum("id" in column for column in columns),
+        )
+
+    def test_edit_costs_a_fixed_number_of_queries(self):
+        for count in (5, 50):
+            self.schema.columns.all().delete()
+            existing = Column.objects.bulk_create(
+                Column(schema=self.schema, name=f"c{index}", data_type="Job", order=0)
+                for index in range(count)
+            )
+            columns = [
+                {"id": column.pk, "name": column.name, "data_type": "Email", "order": 1}
+                for column in existing[1:]
+            ]
+            columns.append({"name": "new", "data_type": "Job", "order": 2})
+            with self.assertNumQueries(12):
+                response = self.edit(columns)
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(
+                self.schema.columns.filter(data_type="Email").count(), count - 1
+            )
+            self.assertEqual(self.schema.columns.count(), count)
+
+    def test_edit_updates_reorders_and_deletes_columns(self):
+        age, name = self.schema.columns.order_by("name")
+        self.edit(
+            [
+                {"id": age.pk, "name": "years", "data_type": "Integer", "order": 5},
+                {"name": "job", "data_type": "Job", "order": 1},
+            ]
+        )
+        self.assertEqual(
+            list(self.schema.columns.order_by("order").values_list("name", "order")),
+            [("job", 1), ("years", 2)],
+        )
+        self.assertFalse(Column.objects.filter(pk=name.pk).exists())
+        self.assertEqual(get_plan(self.schema).fieldnames, ["job", "years"])
+
+    def test_create_saves_schema_and_columns(self):
+        response = self.post_schema(
+            reverse("schemas:schema-create"),
+            [{"name": "email", "data_type": "Email", "order": 1}],
+        )
+        self.assertRedirects(
+            response, reverse("schemas:schemas-list"), fetch_redirect_response=False
+        )
+        schema = DataSchema.objects.latest("pk")
+        self.assertEqual(list(schema.columns.values_list("name", flat=True)), ["email"])
+
+    def test_locale_must_provide_every_column_type(self):
+        url = reverse("schemas:schema-create")
+        columns = [{"name": "phone", "data_type": "Phone number", "order": 1}]
+        response = self.post_schema(url, columns, locale="en_PH")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["form"].errors["locale"],
+            ["Locale 'en_PH' cannot generate Phone number columns."],
+        )
+        self.assertFalse(DataSchema.objects.filter(locale="en_PH").exists())
+        columns[0]["data_type"] = "Email"
+        response = self.post_schema(url, columns, locale="en_PH")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(DataSchema.objects.filter(locale="en_PH").exists())
+
+
+class FakerPoolTests(SchemaTestMixin, TestCase):
+    def test_pooled_faker_is_reused_and_reseeded(self):
+        fakers.warm(["de_DE"])
+        with fakers.borrow_faker("de_DE", 7) as fake:
+            first = fake.name()
+            with fakers.borrow_faker("de_DE", 7) as other:
+                self.assertIsNot(other, fake)
+                self.assertEqual(other.name(), first)
+        with fakers.borrow_faker("de_DE", 7) as again:
+            self.assertIn(again, (fake, other))
+            self.assertEqual(again.name(), first)
+
+    def test_schema_locale_is_used(self):
+        self.schema.locale = "de_DE"
+        with override_settings(MEDIA_ROOT=self.media_root):
+            german = generate_csv(self.schema, 20, seed=1)
+            self.schema.locale = "en_US"
+            english = generate_csv(self.schema, 20, seed=1)
+        with open(german) as german_file, open(english) as english_file:
+            self.assertNotEqual(german_file.read(), english_file.read())
+
+    def test_unknown_locale_is_rejected(self):
+        self.schema.locale = "xx_XX"
+        with self.assertRaises(ValidationError) as raised:
+            self.schema.clean()
+        self.assertEqual(list(raised.exception.message_dict), ["locale"])
+
+
+class KeysetPaginationTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        created_at = timezone.now()
+        # Rows sharing a timestamp are told apart by their primary key
+        for index in range(7):
+            dataset = DataSet.objects.create(schema=self.schema, rows=index + 1)
+            DataSet.objects.filter(pk=dataset.pk).update(
+                created_at=created_at + timedelta(seconds=index // 2)
+            )
+        self.datasets = self.schema.datasets.all()
+
+    def walk(self, descending):
+        pages, params = [], {}
+        while True:
+            page = paginate_keyset(self.datasets, params, 3, descending)
+            pages.append([dataset.rows for dataset in page])
+            if not page.has_next:
+                break
+            params = {"after": page.next_cursor}
+        while page.has_previous:
+            page = paginate_keyset(
+                self.datasets, {"before": page.previous_cursor}, 3, descending
+            )
+            pages.append([dataset.rows for dataset in page])
+        return pages
+
+    def test_pages_walk_forward_and_back(self):
+        self.assertEqual(
+            self.walk(False),
+            [[1, 2, 3], [4, 5, 6], [7], [4, 5, 6], [1, 2, 3]],
+        )
+        self.assertEqual(
+            self.walk(True),
+            [[7, 6, 5], [4, 3, 2], [1], [4, 3, 2], [7, 6, 5]],
+        )
+
+    def test_total_is_cached(self):
+        page = paginate_keyset(self.datasets, {}, 3, cache_key="test")
+        self.assertEqual(page.total, 7)
+        DataSet.objects.create(schema=self.schema, rows=8)
+        with self.assertNumQueries(1):
+            page = paginate_keyset(self.datasets, {}, 3, cache_key="test")
+        self.assertEqual(page.total, 7)
+
+    @mock.patch.object(DatasetView, "paginate_by", 5)
+    def test_dataset_page_links_to_next_page(self):
+        self.client.force_login(self.user)
+        url = reverse("schemas:datasets", kwargs={"pk": self.schema.pk})
+        response = self.client.get(url, {"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url, {"after": "99999999999999999999999-1"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(url)
+        self.assertContains(response, "7 in total")
+        cursor = response.context["datasets"].next_cursor
+        self.assertContains(response, f"after={cursor}")
+        response = self.client.get(url, {"after": cursor})
+        self.assertEqual(
+            [dataset.rows for dataset in response.context["datasets"]], [6, 7]
+        )
+
+
+class BatchGeneratorTests(TestCase):
+    def check_batches(self):
+        fake = Faker()
+        fake.seed_instance(0)
+        integers = batches.integer_batch(fake, -3, 3)(1000)
+        self.assertEqual(set(integers), set(range(-3, 4)))
+        self.assertTrue(all(type(value) is int for value in integers))
+        dates = batches.date_batch(fake, None, None)(1000)
+        self.assertTrue(
+            all(
+                date(1970, 1, 1) <= date.fromisoformat(d) <= date.today() for d in dates
+            )
+        )
+
+    def test_text_batch_is_sanitized_and_sized(self):
+        fake = Faker()
+        fake.seed_instance(0)
+        paragraphs = batches.text_batch(fake, 2, 4)(500)
+        sentences = [paragraph.count(".") for paragraph in paragraphs]
+        self.assertEqual((min(sentences), max(sentences)), (1, 5))
+        self.assertFalse(any("," in p or "\n" in p for p in paragraphs))
+        self.assertEqual(batches.text_batch(fake, 0, 0)(3), ["", "", ""])
+        with mock.patch.object(batches, "MAX_PICKS", 10):
+            wide = batches.text_batch(fake, 90, 200)(20)
+        self.assertTrue(all(50 <= p.count(".") <= 280 for p in wide))
+
+    def test_batches_with_numpy(self):
+        if batches.numpy is None:
+            self.skipTest("NumPy is not installed.")
+        self.check_batches()
+
+    def test_batches_without_numpy(self):
+        with mock.patch.object(batches, "numpy", None):
+            batches.iso_dates.cache_clear()
+            self.addCleanup(batches.iso_dates.cache_clear)
+            self.check_batches()
+
+
+class ChunkWriterTests(TestCase):
+    def check_writer(self, columns, dialect, chunk):
+        config = ShardConfig(compiler.SchemaPlan(columns), dialect, 10, "en_US")
+        expected, written = io.StringIO(), io.StringIO()
+        csv.writer(expected, **dialect).writerows(zip(*chunk) if chunk else [()] * 2)
+        chunk_writer(written, config)(2, chunk)
+        self.assertEqual(written.getvalue(), expected.getvalue())
+
+    def test_output_matches_csv_writer(self):
+        columns = [("name", "Full name", None, None), ("age", "Integer", 0, 9)]
+        chunk = [["Ann Lee", "Bo Chan"], [7, 42]]
+        for dialect in (
+            {"delimiter": ",", "quotechar": '"'},
+            {"delimiter": ";", "quotechar": "“"},
+            {"delimiter": "|", "quotechar": "'"},
+        ):
+            with self.subTest(dialect=dialect):
+                self.check_writer(columns, dialect, chunk)
+        dialect = {"delimiter": ",", "quotechar": '"'}
+        self.check_writer([("text", "Text", 0, 0)], dialect, [["", "Lorem."]])
+        self.check_writer([], dialect, [])
+
+    def test_values_never_need_quoting(self):
+        fake = Faker()
+        fake.seed_instance(0)
+        plan = compiler.SchemaPlan(
+            [(data_type, data_type, 1, 5) for data_type, _ in Column.TYPES]
+        )
+        values = [str(value) for batch in plan.bind(fake) for value in batch(200)]
+        unsafe = set(batches.UNSAFE_CHARACTERS)
+        self.assertFalse([value for value in values if unsafe & set(value)])
+
+
+class SchemaPlanTests(SchemaTestMixin, TestCase):
+    def test_plan_follows_column_order(self):
+        plan = get_plan(self.schema)
+        self.assertEqual(plan.fieldnames, ["name", "age"])
+
+    def test_plan_is_cached_until_invalidated(self):
+        plan = get_plan(self.schema)
+        self.assertIs(get_plan(self.schema), plan)
+        invalidate_plan(self.schema)
+        self.assertIsNot(get_plan(self.schema), plan)
+
+    def test_deleting_column_invalidates_plan(self):
+        plan = get_plan(self.schema)
+        column = self.schema.columns.get(name="age")
+        self.client.force_login(self.user)
+        self.client.post(reverse("schemas:column-delete", kwargs={"pk": column.pk}))
+        self.schema.refresh_from_db()
+        self.assertEqual(get_plan(self.schema).fieldnames, ["name"])
+        self.assertIsNot(get_plan(self.schema), plan)
+
+
+class GenerationJobTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = DataSet.objects.create(schema=self.schema, rows=10)
+
+    def test_generate_view_enqueues_without_generating(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("schemas:generate-file", kwargs={"pk": self.dataset.pk})
+        )
+        self.assertEqual(response.json()["status"], DataSet.QUEUED)
+        self.assertEqual(self.dataset.job.status, GenerationJob.QUEUED)
+        self.dataset.refresh_from_db()
+        self.assertFalse(self.dataset.file)
+
+    def test_generate_view_only_restarts_finished_datasets(self):
+        self.client.force_login(self.user)
+        url = reverse("schemas:generate-file", kwargs={"pk": self.dataset.pk})
+        self.assertEqual(self.client.post(url).status_code, 200)
+        job = claim_job("worker")
+        self.assertEqual(self.client.post(url).status_code, 409)
+        job.refresh_from_db()
+        self.assertEqual(job.worker, "worker")
+        GenerationJob.objects.update(status=GenerationJob.FAILED, attempts=3)
+        DataSet.objects.update(status=DataSet.FAILED)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (GenerationJob.QUEUED, 0))
+        DataSet.objects.update(status=DataSet.READY)
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+    def test_job_is_claimed_once(self):
+        enqueue(self.dataset)
+        self.assertIsNotNone(claim_job("first"))
+        self.assertIsNone(claim_job("second"))
+
+    def test_job_with_expired_lease_is_reclaimed(self):
+        enqueue(self.dataset)
+        claim_job("first")
+        GenerationJob.objects.update(lease_expires_at=timezone.now() - timedelta(1))
+        job = claim_job("second")
+        self.assertEqual(job.worker, "second")
+        self.assertEqual(job.attempts, 2)
+
+    def test_run_job_marks_dataset_ready(self):
+        enqueue(self.dataset)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(claim_job("worker"))
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, DataSet.READY)
+        self.assertEqual(self.dataset.job.status, GenerationJob.DONE)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.media_root, self.dataset.file.name))
+        )
+
+    def test_run_job_marks_dataset_failed(self):
+        self.schema.columns.update(range_from=99, range_to=18)
+        invalidate_plan(self.schema)
+        enqueue(self.dataset)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(claim_job("worker"))
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, DataSet.FAILED)
+        self.assertIn("ValueError", self.dataset.job.error)
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    @override_settings(FAKE_CSV_CHUNK_SIZE=3, FAKE_CSV_PROGRESS_INTERVAL=0)
+    def test_run_job_records_progress(self):
+        enqueue(self.dataset)
+        job = claim_job("worker")
+        _on_chunk(job)(3, 60)
+        self.dataset.refresh_from_db()
+        self.assertEqual((self.dataset.rows_done, self.dataset.bytes_written), (3, 60))
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(job)
+        self.dataset.refresh_from_db()
+        progress = self.dataset.progress()
+        self.assertEqual(progress["rows_done"], 10)
+        self.assertEqual(progress["percent"], 100)
+        self.assertGreater(progress["bytes_written"], 0)
+        self.assertIsNone(progress["eta_seconds"])
+
+    def test_cancelled_job_is_never_claimed(self):
+        enqueue(self.dataset)
+        self.client.force_login(self.user)
+        url = reverse("schemas:dataset-cancel", kwargs={"pk": self.dataset.pk})
+        response = self.client.post(url)
+        self.assertEqual(response.json()["status"], DataSet.CANCELLED)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertIsNone(claim_job("worker"))
+
+    @override_settings(
+        FAKE_CSV_SHARD_ROWS=40, FAKE_CSV_CHUNK_SIZE=15, FAKE_CSV_PROGRESS_INTERVAL=0
+    )
+    def test_cancelled_running_job_stops_and_removes_file(self):
+        self.dataset.rows = 200
+        self.dataset.save()
+        enqueue(self.dataset)
+        job = claim_job("worker")
+        self.assertTrue(cancel(self.dataset))
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(job)
+        self.dataset.refresh_from_db()
+        self.assertEqual(self.dataset.status, DataSet.CANCELLED)
+        self.assertEqual(self.dataset.job.status, GenerationJob.CANCELLED)
+        self.assertIsNone(self.dataset.checkpoint)
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_events_send_current_states_without_waiting(self):
+        self.client.force_login(self.user)
+        self.dataset.status = DataSet.READY
+        self.dataset.save()
+        response = self.client.get(
+            reverse("schemas:dataset-events"), {"id": [self.dataset.pk, "x"]}
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = response.content.decode().split("\n\n")
+        self.assertTrue(events[0].startswith("retry: "))
+        state = json.loads(events[1].removeprefix("data: "))
+        self.assertEqual(state["id"], self.dataset.pk)
+        self.assertEqual(state["status"], DataSet.READY)
+        self.assertEqual(events[2:], [""])
+
+    def test_statuses_of_several_datasets_in_one_request(self):
+        other = DataSet.objects.create(schema=self.schema, rows=5)
+        stranger = User.objects.create_user(username="stranger", password="password")
+        foreign = DataSet.objects.create(
+            schema=DataSchema.objects.create(
+                user=stranger, name="Theirs", column_separator=",", string_character="“"
+            ),
+            rows=5,
+        )
+        self.client.force_login(self.user)
+        ids = f"{self.dataset.pk},{other.pk},{foreign.pk},x"
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("schemas:dataset-statuses"), {"ids": ids}
+            )
+        states = response.json()["datasets"]
+        self.assertEqual(
+            sorted(state["id"] for state in states), [self.dataset.pk, other.pk]
+        )
+
+
+class SchedulingTests(SchemaTestMixin, TestCase):
+    def enqueue_rows(self, rows, schema=None):
+        dataset = DataSet.objects.create(schema=schema or self.schema, rows=rows)
+        enqueue(dataset)
+        dataset.refresh_from_db()
+        return dataset
+
+    def test_small_job_overtakes_large_one(self):
+        large = self.enqueue_rows(100000)
+        small = self.enqueue_rows(10)
+        self.assertLess(small.job.cost, large.job.cost)
+        self.assertEqual(claim_job("worker").dataset, small)
+
+    def test_waiting_job_is_not_starved(self):
+        large = self.enqueue_rows(100000)
+        GenerationJob.objects.filter(dataset=large).update(
+            priority=scheduling.priority(
+                timezone.now() - timedelta(hours=1), large.job.cost
+            )
+        )
+        self.enqueue_rows(10)
+        self.assertEqual(claim_job("worker").dataset, large)
+
+    @override_settings(FAKE_CSV_USER_MAX_RUNNING=1)
+    def test_users_run_limited_jobs_at_once(self):
+        other = User.objects.create_user(username="other", password="password")
+        other_schema = DataSchema.objects.create(
+            user=other, name="Other", column_separator=",", string_character='"'
+        )
+        self.enqueue_rows(10)
+        self.enqueue_rows(10)
+        self.enqueue_rows(100, schema=other_schema)
+        self.assertEqual(claim_job("first").dataset.schema, self.schema)
+        self.assertEqual(claim_job("second").dataset.schema, other_schema)
+        self.assertIsNone(claim_job("third"))
+
+    @override_settings(FAKE_CSV_USER_ROWS_PER_HOUR=15)
+    def test_rows_over_quota_are_deferred_or_rejected(self):
+        queued = self.enqueue_rows(10)
+        deferred = self.enqueue_rows(10)
+        rejected = self.enqueue_rows(20)
+        self.assertEqual(queued.status, DataSet.QUEUED)
+        self.assertEqual(deferred.status, DataSet.DEFERRED)
+        self.assertEqual(
+            deferred.job.scheduled_at, queued.job.scheduled_at + timedelta(hours=1)
+        )
+        self.assertEqual(rejected.status, DataSet.REJECTED)
+        self.assertEqual(claim_job("worker").dataset, queued)
+        self.assertIsNone(claim_job("worker"))
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("schemas:dataset-status", kwargs={"pk": rejected.pk})
+        )
+        self.assertIn("quota of 15 rows per hour", response.json()["detail"])
+
+
+@override_settings(FAKE_CSV_SHARD_ROWS=40, FAKE_CSV_CHUNK_SIZE=15)
+class CheckpointTests(SchemaTestMixin, TestCase):
+    def crash_after(self, shards, checkpoints):
+        def on_checkpoint(checkpoint):
+            checkpoints.append(checkpoint)
+            if checkpoint["shards"] == shards:
+                raise KeyboardInterrupt
+
+        return on_checkpoint
+
+    def test_generation_resumes_from_checkpoint(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with open(generate_csv(self.schema, 130, seed=42)) as csvfile:
+                expected = csvfile.read()
+            checkpoints = []
+            with self.assertRaises(KeyboardInterrupt):
+                generate_csv(
+                    self.schema,
+                    130,
+                    seed=42,
+                    on_checkpoint=self.crash_after(2, checkpoints),
+                )
+            checkpoint = checkpoints[-1]
+            self.assertEqual((checkpoint["rows"], checkpoint["shards"]), (80, 2))
+            path = os.path.join(self.media_root, checkpoint["path"])
+            # Half a shard written after the checkpoint is thrown away
+            with open(path, "a") as csvfile:
+                csvfile.write("partial,row\n")
+            filepath = generate_csv(
+                self.schema,
+                130,
+                checkpoint=checkpoint,
+                on_checkpoint=checkpoints.append,
+            )
+        self.assertEqual(filepath, path)
+        self.assertEqual(checkpoints[-1]["shards"], 4)
+        with open(filepath) as csvfile:
+            self.assertEqual(csvfile.read(), expected)
+
+    def test_stale_processing_dataset_resumes(self):
+        cache_dir = override_settings(
+            FAKE_CSV_CACHE_DIR=os.path.join(self.media_root, "cache")
+        )
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+        dataset = DataSet.objects.create(schema=self.schema, rows=130, seed=7)
+        enqueue(dataset)
+        checkpoints = []
+        with override_settings(MEDIA_ROOT=self.media_root), mock.patch(
+            "fake_csv.jobs._on_checkpoint",
+            return_value=self.crash_after(1, checkpoints),
+        ), self.assertRaises(KeyboardInterrupt):
+            run_job(claim_job("dead"))
+        DataSet.objects.filter(pk=dataset.pk).update(
+            checkpoint=checkpoints[-1],
+            status=DataSet.PROCESSING,
+            progress_updated_at=timezone.now() - timedelta(days=1),
+        )
+        GenerationJob.objects.update(status=GenerationJob.DONE)
+        self.assertEqual(reclaim_stale(), 1)
+        self.assertEqual(reclaim_stale(), 0)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(claim_job("worker"))
+            with open(generate_csv(self.schema, 130, seed=7)) as csvfile:
+                expected = csvfile.read()
+        dataset.refresh_from_db()
+        self.assertEqual(dataset.status, DataSet.READY)
+        self.assertIsNone(dataset.checkpoint)
+        self.assertEqual(dataset.file.name, checkpoints[-1]["path"])
+        with open(os.path.join(self.media_root, dataset.file.name)) as csvfile:
+            self.assertEqual(csvfile.read(), expected)
+
+    def test_cache_hit_discards_checkpoint(self):
+        cache_dir = override_settings(
+            FAKE_CSV_CACHE_DIR=os.path.join(self.media_root, "cache")
+        )
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+        dataset = DataSet.objects.create(schema=self.schema, rows=130, seed=7)
+        checkpoints = []
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with self.assertRaises(KeyboardInterrupt):
+                generate_csv(
+                    self.schema,
+                    130,
+                    seed=7,
+                    on_checkpoint=self.crash_after(1, checkpoints),
+                )
+            cached = cache.generate_cached(self.schema, 130, seed=7)
+            DataSet.objects.filter(pk=dataset.pk).update(checkpoint=checkpoints[-1])
+            enqueue(dataset)
+            run_job(claim_job("worker"))
+        dataset.refresh_from_db()
+        self.assertEqual(dataset.status, DataSet.READY)
+        self.assertIsNone(dataset.checkpoint)
+        with open(cached) as csvfile:
+            expected = csvfile.read()
+        with open(os.path.join(self.media_root, dataset.file.name)) as csvfile:
+            self.assertEqual(csvfile.read(), expected)
+        path = os.path.join(self.media_root, checkpoints[-1]["path"])
+        self.assertFalse(os.path.exists(path))
+
+
+class UniqueColumnTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        # 82 possible ages
+        self.schema.columns.filter(name="age").update(unique=True)
+        invalidate_plan(self.schema)
+
+    def ages(self, filepath):
+        with open(filepath, newline="") as csvfile:
+            return [row["age"] for row in csv.DictReader(csvfile)]
+
+    def test_values_never_repeat_across_shards(self):
+        for exact_limit in (1000, 0):
+            with override_settings(
+                MEDIA_ROOT=self.media_root, FAKE_CSV_UNIQUE_EXACT_LIMIT=exact_limit
+            ):
+                ages = self.ages(generate_csv(self.schema, 80, seed=3))
+            self.assertEqual(len(ages), 80)
+            self.assertEqual(len(set(ages)), 80)
+
+    def test_exhausted_column_fails_with_clear_error(self):
+        dataset = DataSet.objects.create(schema=self.schema, rows=90, seed=1)
+        enqueue(dataset)
+        with override_settings(MEDIA_ROOT=self.media_root):
+            run_job(claim_job("worker"))
+        dataset.refresh_from_db()
+        self.assertEqual(dataset.status, DataSet.FAILED)
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("schemas:dataset-status", kwargs={"pk": dataset.pk})
+        )
+        self.assertIn(
+            "Column 'age' ran out of unique values", response.json()["detail"]
+        )
+        self.assertEqual(os.listdir(self.media_root), [])
+
+    def test_stream_of_too_many_rows_is_refused(self):
+        self.client.force_login(self.user)
+        url = reverse("schemas:dataset-stream", kwargs={"pk": self.schema.pk})
+        response = self.client.get(url, {"rows": 90})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            "Column 'age' has only 82 unique values", response.json()["rows"][0]
+        )
+        self.assertFalse(StreamUsage.objects.exists())
+        response = self.client.get(url, {"rows": 82})
+        self.assertEqual(response.status_code, 200)
+        rows = list(
+            csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode()))
+        )
+        self.assertEqual(len({row["age"] for row in rows}), 82)
+
+    def test_preview_of_too_many_rows_is_refused(self):
+        self.client.force_login(self.user)
+        url = reverse("schemas:dataset-preview", kwargs={"pk": self.schema.pk})
+        response = self.client.get(url, {"rows": 90})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(
+            "Column 'age' ran out of unique values", response.json()["rows"][0]
+        )
+
+    def test_resumed_generation_skips_written_values(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            with open(generate_csv(self.schema, 80, seed=9)) as csvfile:
+                expected = csvfile.read()
+            checkpoints = []
+
+            def on_checkpoint(checkpoint):
+                checkpoints.append(checkpoint)
+                if checkpoint["shards"] == 1:
+                    raise KeyboardInterrupt
+
+            with self.assertRaises(KeyboardInterrupt):
+                generate_csv(self.schema, 80, seed=9, on_checkpoint=on_checkpoint)
+            filepath = generate_csv(
+                self.schema,
+                80,
+                checkpoint=checkpoints[-1],
+                on_checkpoint=checkpoints.append,
+            )
+        with open(filepath) as csvfile:
+            self.assertEqual(csvfile.read(), expected)
+
+    def test_bloom_filter_never_reports_a_seen_value_as_new(self):
+        rng = random.Random(0)
+        values = [rng.randrange(5000) for _ in range(3000)]
+        vectorized = unique.BloomFilter(2000, 0.01, 10)
+        with mock.patch.object(unique, "numpy", None):
+            looped = unique.BloomFilter(2000, 0.01, 10)
+            looped_new = looped.add_many(values)
+        vectorized_new = vectorized.add_many(values)
+        for seen, new in ((looped, looped_new), (vectorized, vectorized_new)):
+            kept = list(compress(values, new))
+            self.assertEqual(len(kept), len(set(kept)))
+            self.assertEqual(len(seen), len(kept))
+            self.assertEqual(seen.add_many(values[:10]), [False] * 10)
+        # Batches are checked against the bits set before them, so the
+        # vectorized filter has fewer false positives but the same bits
+        self.assertEqual(vectorized.bits, looped.bits)
+        self.assertLessEqual(sum(looped_new), sum(vectorized_new))
+
+
+class ValuePoolTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        pool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pool_dir)
+        settings_override = override_settings(
+            FAKE_CSV_POOL_DIR=pool_dir, FAKE_CSV_POOL_SIZE=50
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_pool_is_built_once_and_mapped(self):
+        pool = get_pool("Full name", "en_US")
+        self.assertEqual(len(pool), 50)
+        self.assertIs(get_pool("Full name", "en_US"), pool)
+        self.assertEqual(pickle.loads(pickle.dumps(pool))[7], pool[7])
+        self.assertEqual(len(set(pool.sample(random.Random(0), 10))), 10)
+
+    def test_pool_is_rebuilt_when_size_changes(self):
+        get_pool("Job", "en_US")
+        with override_settings(FAKE_CSV_POOL_SIZE=20):
+            self.assertEqual(len(get_pool("Job", "en_US")), 20)
+
+    def test_pooled_generation_samples_from_pool(self):
+        pool = get_pool("Full name", "en_US")
+        names = {pool[index] for index in range(len(pool))}
+        with override_settings(MEDIA_ROOT=self.media_root):
+            filepath = generate_csv(self.schema, 30, pooled=True)
+        with open(filepath, newline="") as csvfile:
+            rows = list(csv.reader(csvfile))[1:]
+        self.assertTrue(all(row[0] in names for row in rows))
+
+
+class DatasetCacheTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            FAKE_CSV_CACHE_DIR=os.path.join(self.media_root, "cache"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_seeded_dataset_is_reused(self):
+        first = cache.generate_cached(self.schema, 20, seed=7)
+        with mock.patch.object(cache, "generate_csv") as generate_csv:
+            second = cache.generate_cached(self.schema, 20, seed=7)
+        generate_csv.assert_not_called()
+        self.assertNotEqual(first, second)
+        with open(first) as first_file, open(second) as second_file:
+            self.assertEqual(first_file.read(), second_file.read())
+
+    def test_cache_key_depends_on_inputs(self):
+        key = cache.cache_key(self.schema, 20, 7, "en_US", False)
+        self.assertEqual(key, cache.cache_key(self.schema, 20, 7, "en_US", False))
+        self.assertNotEqual(key, cache.cache_key(self.schema, 21, 7, "en_US", False))
+        self.assertNotEqual(key, cache.cache_key(self.schema, 20, 8, "en_US", False))
+        self.assertNotEqual(key, cache.cache_key(self.schema, 20, 7, "de_DE", False))
+
+    def test_cache_key_depends_on_environment(self):
+        Column.objects.create(
+            schema=self.schema, name="born", data_type="Date", order=3
+        )
+        self.schema.columns.filter(name="age").update(unique=True)
+        invalidate_plan(self.schema)
+        key = cache.cache_key(self.schema, 20, 7, "en_US", False)
+        with mock.patch.object(cache, "date") as patched_date:
+            patched_date.today.return_value = date.today() + timedelta(days=1)
+            self.assertNotEqual(
+                key, cache.cache_key(self.schema, 20, 7, "en_US", False)
+            )
+        with mock.patch.object(cache, "numpy", None if cache.numpy else mock.Mock()):
+            self.assertNotEqual(
+                key, cache.cache_key(self.schema, 20, 7, "en_US", False)
+            )
+        with override_settings(FAKE_CSV_UNIQUE_EXACT_LIMIT=0):
+            self.assertNotEqual(
+                key, cache.cache_key(self.schema, 20, 7, "en_US", False)
+            )
+        self.assertEqual(key, cache.cache_key(self.schema, 20, 7, "en_US", False))
+
+    def test_unseeded_dataset_is_not_cached(self):
+        cache.generate_cached(self.schema, 20)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, "cache")))
+
+    def test_eviction_keeps_dataset_files(self):
+        filepath = cache.generate_cached(self.schema, 20, seed=7)
+        with override_settings(FAKE_CSV_CACHE_MAX_BYTES=0):
+            cache.evict()
+        self.assertEqual(os.listdir(os.path.join(self.media_root, "cache")), [])
+        self.assertTrue(os.path.exists(filepath))
+
+
+class StreamDatasetViewTests(SchemaTestMixin, TestCase):
+    def test_stream_matches_generated_file(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            filepath = generate_csv(self.schema, 30, seed=3)
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("schemas:dataset-stream", kwargs={"pk": self.schema.pk}),
+            {"rows": 30, "seed": 3},
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn("attachment", response["Content-Disposition"])
+        with open(filepath, newline="") as csvfile:
+            self.assertEqual(
+                b"".join(response.streaming_content).decode(), csvfile.read()
+            )
+        self.assertEqual(os.listdir(self.media_root), [os.path.basename(filepath)])
+
+    def test_header_is_yielded_before_rows_are_generated(self):
+        chunks = iter_csv(self.schema, 10**7)
+        self.assertEqual(next(chunks), "name,age\r\n")
+
+    def test_stream_requires_schema_owner(self):
+        other = User.objects.create_user(username="other", password="password")
+        self.client.force_login(other)
+        response = self.client.get(
+            reverse("schemas:dataset-stream", kwargs={"pk": self.schema.pk}),
+            {"rows": 5},
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class DownloadTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        with open(os.path.join(self.media_root, "people.csv"), "wb") as file:
+            file.write(b"name,age\r\nAda,36\r\n")
+        self.dataset = DataSet.objects.create(
+            schema=self.schema, rows=1, file="people.csv", status=DataSet.READY
+        )
+        self.url = reverse("schemas:dataset-download", kwargs={"pk": self.dataset.pk})
+        media_root = override_settings(MEDIA_ROOT=self.media_root)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+
+    def test_only_owner_downloads_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            b"".join(response.streaming_content), b"name,age\r\nAda,36\r\n"
+        )
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(
+            response["Content-Disposition"], 'attachment; filename="people.csv"'
+        )
+        self.assertEqual(
+            self.client.get(
+                reverse("schemas:dataset-status", kwargs={"pk": self.dataset.pk})
+            ).json()["file_url"],
+            self.url,
+        )
+        other = User.objects.create_user(username="other", password="password")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_ranges_and_conditional_requests(self):
+        etag = self.client.get(self.url)["ETag"]
+        for header, content_range, body in (
+            ("bytes=10-13", "bytes 10-13/18", b"Ada,"),
+            ("bytes=14-", "bytes 14-17/18", b"36\r\n"),
+            ("bytes=-4", "bytes 14-17/18", b"36\r\n"),
+        ):
+            response = self.client.get(self.url, HTTP_RANGE=header, HTTP_IF_RANGE=etag)
+            self.assertEqual(response.status_code, 206)
+            self.assertEqual(response["Content-Range"], content_range)
+            self.assertEqual(b"".join(response.streaming_content), body)
+        response = self.client.get(self.url, HTTP_RANGE="bytes=18-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */18")
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_columnar_file_has_its_content_type(self):
+        DataSchema.objects.filter(pk=self.schema.pk).update(file_format="parquet")
+        os.rename(
+            os.path.join(self.media_root, "people.csv"),
+            os.path.join(self.media_root, "people.parquet"),
+        )
+        DataSet.objects.filter(pk=self.dataset.pk).update(file="people.parquet")
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-3")
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.parquet")
+
+    @override_settings(FAKE_CSV_SENDFILE_HEADER="X-Accel-Redirect")
+    def test_hands_off_to_front_proxy(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/people.csv")
+        self.assertEqual(response.content, b"")
+
+
+class StreamQuotaTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("schemas:dataset-stream", kwargs={"pk": self.schema.pk})
+
+    @override_settings(FAKE_CSV_USER_ROWS_PER_HOUR=100, FAKE_CSV_STREAM_MAX_ROWS=80)
+    def test_streams_count_against_row_quota(self):
+        self.assertEqual(self.client.get(self.url, {"rows": 81}).status_code, 429)
+        response = self.client.get(self.url, {"rows": 60})
+        self.assertEqual(response.status_code, 200)
+        b"".join(response.streaming_content)
+        self.assertEqual(self.client.get(self.url, {"rows": 60}).status_code, 429)
+        dataset = DataSet.objects.create(schema=self.schema, rows=60)
+        enqueue(dataset)
+        self.assertEqual(dataset.status, DataSet.DEFERRED)
+
+    def test_negative_rows_are_refused(self):
+        self.assertEqual(self.client.get(self.url, {"rows": -5000}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"rows": 0}).status_code, 400)
+        self.assertFalse(reserve_stream(self.user, -5000))
+        self.assertFalse(StreamUsage.objects.exists())
+        dataset = DataSet.objects.create(schema=self.schema, rows=-5000)
+        job = enqueue(dataset)
+        self.assertEqual(dataset.status, DataSet.REJECTED)
+        self.assertEqual(job.error, "A dataset needs at least 1 row.")
+
+
+class PreviewTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.url = reverse("schemas:dataset-preview", kwargs={"pk": self.schema.pk})
+
+    def test_preview_is_generated_in_memory(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            response = self.client.get(self.url, {"rows": 5})
+            html = self.client.get(self.url, {"format": "html"})
+        preview = response.json()
+        self.assertEqual(preview["fieldnames"], ["name", "age"])
+        self.assertEqual(len(preview["rows"]), 5)
+        self.assertEqual(html.content.decode().count("<tr>"), 21)
+        self.assertFalse(DataSet.objects.exists())
+        self.assertEqual(os.listdir(self.media_root), [])
+        self.assertEqual(self.client.get(self.url, {"rows": 0}).status_code, 400)
+
+    def test_preview_is_cached_until_schema_changes(self):
+        with mock.patch.object(
+            preview, "generate_preview", wraps=preview.generate_preview
+        ) as generate:
+            first = self.client.get(self.url).json()
+            self.assertEqual(self.client.get(self.url).json(), first)
+            self.assertEqual(generate.call_count, 1)
+            self.schema.columns.filter(name="age").update(name="years")
+            invalidate_plan(self.schema)
+            changed = self.client.get(self.url).json()
+        self.assertEqual(generate.call_count, 2)
+        self.assertEqual(changed["fieldnames"], ["name", "years"])
+
+
+class CompressionTests(SchemaTestMixin, TestCase):
+    def read_plain(self):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            filepath = generate_csv(self.schema, 40, seed=5)
+        with open(filepath, "rb") as plain:
+            return plain.read()
+
+    def generate(self, codec):
+        with override_settings(MEDIA_ROOT=self.media_root):
+            filepath = generate_csv(self.schema, 40, seed=5, compression=codec)
+        self.assertTrue(filepath.endswith(compression.EXTENSIONS[codec]))
+        with open(filepath, "rb") as compressed:
+            return compressed.read()
+
+    def test_gzip(self):
+        self.assertEqual(gzip.decompress(self.generate("gzip")), self.read_plain())
+
+    def test_zip(self):
+        with zipfile.ZipFile(io.BytesIO(self.generate("zip"))) as archive:
+            self.assertEqual(archive.read("people.csv"), self.read_plain())
+
+    def test_zstd(self):
+        if compression.zstandard is None:
+            self.skipTest("zstandard is not installed.")
+        data = (
+            compression.zstandard.ZstdDecompressor()
+            .decompressobj()
+            .decompress(self.generate("zstd"))
+        )
+        self.assertEqual(data, self.read_plain())
+
+    def test_stream_is_compressed_in_flight(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("schemas:dataset-stream", kwargs={"pk": self.schema.pk}),
+            {"rows": 40, "seed": 5, "compression": "gzip"},
+        )
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertIn('filename="people.csv.gz"', response["Content-Disposition"])
+        self.assertEqual(
+            gzip.decompress(b"".join(response.streaming_content)), self.read_plain()
+        )
+
+
+@override_settings(FAKE_CSV_CHUNK_SIZE=10)
+class ColumnarTests(SchemaTestMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        if columnar.pyarrow is None:
+            self.skipTest("pyarrow is not installed.")
+        Column.objects.create(
+            schema=self.schema, name="joined", data_type="Date", order=3
+        )
+        invalidate_plan(self.schema)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def csv_rows(self):
+        with open(generate_csv(self.schema, 35, seed=9), newline="") as csvfile:
+            return list(csv.reader(csvfile))[1:]
+
+    def test_parquet_is_typed_and_matches_csv(self):
+        filepath = columnar.generate_columnar(self.schema, 35, "parquet", seed=9)
+        parquet_file = columnar.pyarrow.parquet.ParquetFile(filepath)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 4)
+        table = parquet_file.read()
+        self.assertEqual(str(table.schema.field("age").type), "int64")
+        self.assertEqual(str(table.schema.field("joined").type), "date32[day]")
+        rows = [
+            [row["name"], str(row["age"]), row["joined"].isoformat()]
+            for row in table.to_pylist()
+        ]
+        self.assertEqual(rows, self.csv_rows())
+
+    def test_arrow_stream(self):
+        filepath = columnar.generate_columnar(
+            self.schema, 35, "arrow", seed=9, compression="zstd"
+        )
+        with columnar.pyarrow.ipc.open_stream(filepath) as reader:
+            table = reader.read_all()
+        self.assertEqual(table.num_rows, 35)
+        self.assertEqual(table.column("age").to_pylist()[0], int(self.csv_rows()[0][1]))
+
+    def test_unsupported_compression_is_rejected(self):
+        self.schema.file_format = "parquet"
+        self.schema.save()
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("schemas:datasets", kwargs={"pk": self.schema.pk}),
+            {"rows": 10, "compression": "zip"},
+        )
+        self.assertContains(response, "do not support zip compression")
+        self.assertFalse(self.schema.datasets.exists())
+
+
+class BenchmarkTests(TestCase):
+    def test_types_suite_covers_every_type(self):
+        results = benchmarks.types_suite(50)
+        self.assertEqual(
+            [result["case"] for result in results],
+            [data_type for data_type, _ in Column.TYPES],
+        )
+        self.assertTrue(all(result["bytes"] > 0 for result in results))
+
+    def test_unique_suite_measures_both_filters(self):
+        results = benchmarks.unique_suite(1000)
+        self.assertEqual(
+            [(result["case"], result["rows"]) for result in results],
+            [("exact", 1000), ("bloom", 1000), ("integer column", 1000)],
+        )
+        self.assertEqual(results[0]["false_positives"], 0)
+
+    def test_regression_past_threshold_fails(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, "results.json")
+        call_command(
+            "benchmark", suite=["scale"], rows=1000, output=output, stdout=io.StringIO()
+        )
+        with open(output) as file:
+            run = json.load(file)
+        self.assertEqual(
+            benchmarks.find_regressions(run["results"], run["results"], 0.2), []
+        )
+        for result in run["results"]:
+            result["rows_per_sec"] *= 10
+        with open(output, "w") as file:
+            json.dump(run, file)
+        with self.assertRaisesMessage(CommandError, "rows_per_sec fell"):
+            call_command(
+                "benchmark",
+                suite=["scale"],
+                rows=1000,
+                baseline=output,
+                stdout=io.StringIO(),
+            )
@@ -0,0 +1,208 @@
+import hashlib
+import math
+import sys
+from itertools import compress, islice
+
+from django.conf import settings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LN2 = math.log(2)
+
+# Rows read back at a time when refilling filters from a written file
+REFILL_ROWS = 10000
+
+
+class UniqueExhausted(ValueError):
+    """Raised when a unique column cannot draw any more new values."""
+
+
+class ExactFilter:
+    """
+    Set of every value seen, for columns of up to
+    ``FAKE_CSV_UNIQUE_EXACT_LIMIT`` values.
+    """
+
+    def __init__(self, max_tries):
+        self.values = set()
+        self.max_tries = max_tries
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nbytes(self):
+        values = self.values
+        return sys.getsizeof(values) + sum(map(sys.getsizeof, values))
+
+    def add_many(self, values):
+        """Add ``values`` in order and flag the ones that were new."""
+        seen = self.values
+        new = []
+        for value in map(str, values):
+            size = len(seen)
+            seen.add(value)
+            new.append(len(seen) > size)
+        return new
+
+
+class BloomFilter:
+    """
+    Bloom filter of the values seen, sized for ``capacity`` values.
+
+    Memory is a fixed ``capacity * log2(1 / error_rate) / ln 2`` bits
+    whatever the values, instead of a Python string and set slot each. A
+    value is only reported new when it certainly is, so a unique column
+    never repeats a value; a false positive merely costs a redraw, with
+    probability ``error_rate`` once the filter is full. Bit positions are
+    derived from a BLAKE2 digest rather than ``hash()``, which is salted
+    per process, so seeded output stays deterministic. Installing the
+    optional ``numpy`` package vectorizes adds.
+    """
+
+    def __init__(self, capacity, error_rate, max_tries):
+        capacity = max(capacity, 1)
+        self.size = max(math.ceil(-capacity * math.log(error_rate) / LN2**2), 8)
+        self.hashes = max(round(self.size / capacity * LN2), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+        self.max_tries = max_tries
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def _add_distinct(self, keys):
+        """Add distinct ``keys`` and flag the ones whose bits were not all set."""
+        size = self.size
+        bits = self.bits
+        blake2b = hashlib.blake2b
+        # The first bit position and the step between positions of each key
+        digests = b"".join(
+            [blake2b(key.encode(), digest_size=16).digest() for key in keys]
+        )
+        if numpy is not None:
+            halves = numpy.frombuffer(digests, dtype="<u8").reshape(-1, 2) % size
+            halves[:, 1] += halves[:, 1] == 0
+            offsets = numpy.arange(self.hashes, dtype=numpy.uint64)
+            positions = (halves[:, :1] + offsets * halves[:, 1:]) % size
+            indexes = (positions >> 3).astype(numpy.intp)
+            shifts = (positions & 7).astype(numpy.uint8)
+            array = numpy.frombuffer(bits, dtype=numpy.uint8)
+            new = ~((array[indexes] >> shifts) & 1).astype(bool).all(axis=1)
+            # One pass per bit, so repeated bytes do not lose each other's bits
+            for shift in range(8):
+                chosen = indexes[shifts == shift]
+                array[chosen] |= 1 << shift
+            return new.tolist()
+        new = []
+        hashes = range(self.hashes)
+        for start in range(0, len(digests), 16):
+            first = int.from_bytes(digests[start : start + 8], "little") % size
+            step = int.from_bytes(digests[start + 8 : start + 16], "little") % size
+            step = step or 1
+            added = False
+            for index in hashes:
+                position = (first + index * step) % size
+                mask = 1 << (position & 7)
+                if not bits[position >> 3] & mask:
+                    bits[position >> 3] |= mask
+                    added = True
+            new.append(added)
+        return new
+
+    def add_many(self, values):
+        """Add ``values`` in order and flag the ones that were certainly new."""
+        keys = list(map(str, values))
+        distinct = list(dict.fromkeys(keys))
+        verdicts = dict(zip(distinct, self._add_distinct(distinct)))
+        new = []
+        for key in keys:
+            new.append(verdicts[key])
+            verdicts[key] = False
+        self.count += sum(new)
+        return new
+
+
+def new_filter(capacity):
+    """
+    Return the filter of a unique column expected to hold ``capacity``
+    values: an exact set up to ``FAKE_CSV_UNIQUE_EXACT_LIMIT`` values and a
+    Bloom filter with a ``FAKE_CSV_UNIQUE_ERROR_RATE`` false positive rate
+    above it.
+    """
+    max_tries = settings.FAKE_CSV_UNIQUE_MAX_TRIES
+    if capacity <= settings.FAKE_CSV_UNIQUE_EXACT_LIMIT:
+        return ExactFilter(max_tries)
+    return BloomFilter(capacity, settings.FAKE_CSV_UNIQUE_ERROR_RATE, max_tries)
+
+
+def new_filters(plan, capacity):
+    """Map the index of every unique column of ``plan`` to a new filter."""
+    return {
+        index: new_filter(capacity)
+        for index, unique in enumerate(plan.unique)
+        if unique
+    }
+
+
+def check_capacity(plan, rows):
+    """
+    Raise ``UniqueExhausted`` when a unique column of ``plan`` has fewer
+    possible values than ``rows``, which is only known for Integer ranges.
+    """
+    for (name, data_type, range_from, range_to), unique in zip(
+        plan.columns, plan.unique
+    ):
+        if not unique or data_type != "Integer":
+            continue
+        capacity = range_to - range_from + 1
+        if capacity < rows:
+            raise UniqueExhausted(
+                f"Column {name!r} has only {capacity} unique values for "
+                f"{rows} rows. Widen its range or request fewer rows."
+            )
+
+
+def refill(filters, rows):
+    """Add the values of already written ``rows`` to ``filters``."""
+    rows = iter(rows)
+    while chunk := list(islice(rows, REFILL_ROWS)):
+        for index, seen in filters.items():
+            seen.add_many([row[index] for row in chunk])
+
+
+def unique_batch(batch, seen, name):
+    """
+    Wrap a batch generator to only return values not in the filter ``seen``.
+
+    Values already drawn are dropped and drawn again, at most
+    ``seen.max_tries`` draws per requested value; ``UniqueExhausted`` is
+    raised past that, which only happens once the column's value space is
+    (nearly) used up.
+    """
+    max_tries = seen.max_tries
+
+    def unique(size):
+        values = []
+        draws = 0
+        while len(values) < size:
+            if draws >= size * max_tries:
+                raise UniqueExhausted(
+                    f"Column {name!r} ran out of unique values after "
+                    f"{len(seen)} rows: {max_tries} draws per value found no "
+                    f"new one. Widen its range or request fewer rows."
+                )
+            wanted = size - len(values)
+            draws += wanted
+            drawn = batch(wanted)
+            values.extend(compress(drawn, seen.add_many(drawn)))
+        return values
+
+    return unique
@@ -8,6 +8,13 @@ from fake_csv.views import (
     DeleteSchemaView,
     DeleteColumnView,
     GenerateFileView,
+    CancelDatasetView,
+    DatasetStatusView,
+    DatasetStatusesView,
+    DatasetEventsView,
+    StreamDatasetView,
+    PreviewDatasetView,
+    DownloadDatasetView,
 )
 
 urlpatterns = [
@@ -26,6 +33,41 @@ urlpatterns = [
         name="column-delete",
     ),
     path("datasets/<int:pk>/update/", GenerateFileView.as_view(), name="generate-file"),
+    path(
+        "datasets/<int:pk>/cancel/",
+        CancelDatasetView.as_view(),
+        name="dataset-cancel",
+    ),
+    path(
+        "datasets/<int:pk>/status/",
+        DatasetStatusView.as_view(),
+        name="dataset-status",
+    ),
+    path(
+        "datasets/status/",
+        DatasetStatusesView.as_view(),
+        name="dataset-statuses",
+    ),
+    path(
+        "datasets/events/",
+        DatasetEventsView.as_view(),
+        name="dataset-events",
+    ),
+    path(
+        "datasets/<int:pk>/stream/",
+        StreamDatasetView.as_view(),
+        name="dataset-stream",
+    ),
+    path(
+        "datasets/<int:pk>/download/",
+        DownloadDatasetView.as_view(),
+        name="dataset-download",
+    ),
+    path(
+        "datasets/<int:pk>/preview/",
+        PreviewDatasetView.as_view(),
+        name="dataset-preview",
+    ),
 ]
 
 app_name = "schemas"
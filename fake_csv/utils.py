@@ -1,63 +1,445 @@
 import csv
+import hashlib
+import io
 import os
 import random
+import shutil
+import tracemalloc
 import uuid
-from faker import Faker
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import repeat
+
+from django.conf import settings
 from slugify import slugify
 
-from fake_csv_service import settings
-
-
-def generate_csv(schema, rows):
-    fake = Faker()
-    columns = schema.columns.all()
-    field_order = {column.order: column.name for column in columns}
-    fieldnames = [field_order[order] for order in sorted(field_order.keys())]
-    data = []
-
-    for _ in range(rows):
-        row = {}
-        for column in columns:
-            data_type = column.data_type
-            range_from = column.range_from
-            range_to = column.range_to
-            if data_type == "Full name":
-                row[column.name] = fake.name().replace("\n", " ").replace(",", "")
-            elif data_type == "Job":
-                row[column.name] = fake.job().replace("\n", " ").replace(",", "")
-            elif data_type == "Email":
-                row[column.name] = fake.email().replace("\n", " ").replace(",", "")
-            elif data_type == "Domain name":
-                row[column.name] = fake.domain_name().replace("\n", " ").replace(",", "")
-            elif data_type == "Phone number":
-                row[column.name] = fake.phone_number()
-            elif data_type == "Company name":
-                row[column.name] = fake.company().replace("\n", " ").replace(",", "")
-            elif data_type == "Text":
-                sentences_number = random.randint(range_from, range_to)
-                row[column.name] = fake.paragraph(
-                    variable_nb_sentences=True, nb_sentences=sentences_number
-                ).replace("\n", " ").replace(",", "")
-            elif data_type == "Integer":
-                row[column.name] = fake.random_int(min=range_from, max=range_to)
-            elif data_type == "Address":
-                row[column.name] = fake.address().replace("\n", " ").replace(",", "")
-            elif data_type == "Date":
-                row[column.name] = fake.date().replace("\n", " ").replace(",", "")
-        data.append(row)
-
-    filename = f"{slugify(fake.word())}-{uuid.uuid4()}.csv"
-    filepath = os.path.join(settings.MEDIA_ROOT, filename)
-
-    with open(filepath, "w", newline="") as csvfile:
-        writer = csv.DictWriter(
-            csvfile,
-            fieldnames=fieldnames,
-            quotechar=schema.string_character,
-            delimiter=schema.column_separator,
-        )
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
+from .batches import UNSAFE_CHARACTERS
+from .compiler import get_plan
+from .compression import EXTENSIONS, open_output
+from .fakers import borrow_faker
+from .pools import get_pools
+from .profiling import Profiler
+from .unique import new_filters, refill
+
+LINE_TERMINATOR = "\r\n"
+
+
+class Cancelled(Exception):
+    """Raised by a generation callback to stop and discard the partial file."""
+
+
+def iter_column_chunks(batches, rows, chunk_size, profiler=None):
+    """
+    Lazily yield ``rows`` rows in chunks of at most ``chunk_size`` rows.
+
+    Each chunk is a ``(size, columns)`` pair holding one list of values per
+    column, generated with the ``batches`` of a bound plan. Chunks picked
+    by ``profiler`` are generated under its timers.
+    """
+    for start in range(0, rows, chunk_size):
+        size = min(chunk_size, rows - start)
+        if profiler is not None and profiler.sample():
+            yield size, profiler.generate(batches, size)
+        else:
+            yield size, [batch(size) for batch in batches]
+
+
+def iter_chunks(batches, rows, chunk_size, profiler=None):
+    """Like ``iter_column_chunks``, but yield each chunk as a list of row tuples."""
+    for size, columns in iter_column_chunks(batches, rows, chunk_size, profiler):
+        if columns:
+            yield list(zip(*columns))
+        else:
+            yield [()] * size
+
+
+def iter_shards(rows, shard_rows):
+    """Yield ``(index, rows)`` pairs splitting ``rows`` into ``shard_rows`` shards."""
+    for index, start in enumerate(range(0, rows, shard_rows)):
+        yield index, min(shard_rows, rows - start)
+
+
+def shard_seed(seed, index):
+    """Derive the Faker seed of shard ``index`` from the dataset ``seed``."""
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class ShardConfig:
+    """
+    Settings shared by every shard of one generation job.
+
+    Holds only picklable values, so it can be sent to pool processes that
+    do not have Django settings configured. ``filters`` holds the values
+    drawn so far by the plan's unique columns, so a config with filters
+    generates one dataset, shard after shard, in a single process.
+    """
+
+    def __init__(self, plan, dialect, chunk_size, locale, pools=None, filters=None):
+        self.plan = plan
+        self.dialect = dialect
+        self.chunk_size = chunk_size
+        self.locale = locale
+        self.pools = pools
+        self.filters = filters
+
+
+@contextmanager
+def bind_shard(config, seed):
+    """Bind the plan of ``config`` to a pooled Faker seeded with ``seed``."""
+    with borrow_faker(config.locale, seed) as fake:
+        yield config.plan.bind(fake, config.pools, config.filters)
+
+
+def chunk_writer(file, config):
+    """
+    Return a function writing one chunk of generated columns to ``file``.
+
+    The function takes the chunk's ``size`` and ``columns`` and writes the
+    whole chunk with a single ``write`` call. Generated values never contain
+    ``UNSAFE_CHARACTERS``, so when the separator and string character are
+    among them no value needs quoting. Rows are then joined straight into
+    text, and only integer columns are converted, with one ``map`` per column.
+    Other dialects go through ``csv.writer``.
+    """
+    dialect = config.dialect
+    if (
+        dialect["delimiter"] not in UNSAFE_CHARACTERS
+        or dialect["quotechar"] not in UNSAFE_CHARACTERS
+    ):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, **dialect)
+
+        def write(size, columns):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(zip(*columns) if columns else [()] * size)
+            file.write(buffer.getvalue())
+
+        return write
+
+    delimiter = dialect["delimiter"]
+    integers = [
+        index
+        for index, (_, data_type, _, _) in enumerate(config.plan.columns)
+        if data_type == "Integer"
+    ]
+    # csv.writer quotes a lone empty value so the row is not read as blank
+    empty = dialect["quotechar"] * 2 if len(config.plan.columns) == 1 else ""
+
+    def write(size, columns):
+        if not columns:
+            file.write(LINE_TERMINATOR * size)
+            return
+        columns = list(columns)
+        for index in integers:
+            columns[index] = map(str, columns[index])
+        if len(columns) > 1:
+            lines = map(delimiter.join, zip(*columns))
+        elif empty:
+            lines = [value or empty for value in columns[0]]
+        else:
+            lines = columns[0]
+        file.write(LINE_TERMINATOR.join(lines) + LINE_TERMINATOR)
+
+    return write
+
+
+def write_shard(write, config, rows, seed, on_chunk=None, rows_done=0, profiler=None):
+    """
+    Write ``rows`` rows generated by a Faker seeded with ``seed`` through
+    the ``chunk_writer`` function ``write``.
+
+    ``rows_done`` is the number of rows written before this shard; the
+    updated count is passed to ``on_chunk`` and returned.
+    """
+    with bind_shard(config, seed) as batches:
+        for size, columns in iter_column_chunks(
+            batches, rows, config.chunk_size, profiler
+        ):
+            if profiler is not None and profiler.sampling:
+                profiler.write(write, size, columns)
+            else:
+                write(size, columns)
+            rows_done += size
+            if on_chunk is not None:
+                on_chunk(rows_done)
+    return rows_done
+
+
+def generate_part(part_path, config, rows, seed, profile_every=0):
+    """
+    Write one shard, without a header, to ``part_path`` in a pool process.
+
+    Returns ``part_path`` and, when ``profile_every`` is set, the summary
+    of a profiler sampling one chunk in ``profile_every``.
+    """
+    profiler = (
+        Profiler(config.plan, config.pools, profile_every) if profile_every else None
+    )
+    with open(part_path, "w", encoding="utf-8", newline="") as part:
+        write_shard(chunk_writer(part, config), config, rows, seed, profiler=profiler)
+    return part_path, profiler and profiler.summary()
+
+
+def new_filepath(extension="csv"):
+    """Return a fresh, unique path for a generated file under ``MEDIA_ROOT``."""
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    with borrow_faker(settings.FAKE_CSV_LOCALE) as fake:
+        word = fake.word()
+    filename = f"{slugify(word)}-{uuid.uuid4()}.{extension}"
+    return os.path.join(settings.MEDIA_ROOT, filename)
+
+
+def shard_config(schema, pooled=None, locale=None, rows=0):
+    """
+    Build the ``ShardConfig`` of a job generating ``rows`` rows of ``schema``.
+
+    ``pooled`` and ``locale`` default to ``FAKE_CSV_POOLED`` and the
+    schema's locale. Unique columns get filters sized for ``rows`` values.
+    """
+    plan = get_plan(schema)
+    if pooled is None:
+        pooled = settings.FAKE_CSV_POOLED
+    if locale is None:
+        locale = schema.locale
+    return ShardConfig(
+        plan,
+        {"quotechar": schema.string_character, "delimiter": schema.column_separator},
+        settings.FAKE_CSV_CHUNK_SIZE,
+        locale,
+        get_pools(plan, locale) if pooled else None,
+        new_filters(plan, rows),
+    )
+
+
+def iter_csv(schema, rows, seed=None, pooled=None, locale=None):
+    """
+    Return an iterator lazily yielding the CSV text of ``rows`` fake rows.
+
+    The schema is compiled up front, the header is yielded before any row
+    is generated, and every following chunk is only generated once the
+    consumer asks for it. The output is the same as ``generate_csv``
+    writes for the same ``seed``.
+    """
+    config = shard_config(schema, pooled, locale, rows)
+    if seed is None:
+        seed = random.getrandbits(64)
+    return _iter_csv(config, rows, seed)
+
+
+def _iter_csv(config, rows, seed):
+    buffer = io.StringIO()
+    csv.writer(buffer, **config.dialect).writerow(config.plan.fieldnames)
+    yield buffer.getvalue()
+    write = chunk_writer(buffer, config)
+    for index, shard_rows in iter_shards(rows, settings.FAKE_CSV_SHARD_ROWS):
+        with bind_shard(config, shard_seed(seed, index)) as batches:
+            for size, columns in iter_column_chunks(
+                batches, shard_rows, config.chunk_size
+            ):
+                buffer.seek(0)
+                buffer.truncate()
+                write(size, columns)
+                yield buffer.getvalue()
+
+
+def can_resume(checkpoint):
+    """Return whether the partial file of ``checkpoint`` is still there to resume."""
+    path = os.path.join(settings.MEDIA_ROOT, checkpoint["path"])
+    return os.path.exists(path) and os.path.getsize(path) >= checkpoint["offset"]
+
+
+def refill_from(filepath, config):
+    """Add the values of the rows already in the CSV file at ``filepath``."""
+    with open(filepath, encoding="utf-8", newline="") as file:
+        reader = csv.reader(file, **config.dialect)
+        next(reader, None)
+        refill(config.filters, reader)
+
+
+def generate_csv(
+    schema,
+    rows,
+    stats=None,
+    on_chunk=None,
+    seed=None,
+    pooled=None,
+    locale=None,
+    compression="",
+    profile=None,
+    checkpoint=None,
+    on_checkpoint=None,
+):
+    """
+    Generate a CSV file with ``rows`` fake rows for ``schema``.
+
+    Rows are generated column by column and written in chunks of
+    ``FAKE_CSV_CHUNK_SIZE`` by ``chunk_writer``, through a write buffer of
+    ``FAKE_CSV_WRITE_BUFFER`` bytes, so memory use does not depend on
+    ``rows``.
+    When a ``stats`` dict is passed, memory allocations are traced and
+    ``stats["peak_memory"]`` is set to the peak traced size in bytes.
+    When a ``profile`` dict is passed, one chunk in
+    ``FAKE_CSV_PROFILE_EVERY`` is profiled and ``profile`` is filled with
+    the ``Profiler`` summary.
+    ``on_chunk`` is called with the number of rows and bytes written so
+    far after every chunk. If generation fails, the partial file is
+    removed.
+
+    The rows are split into shards of ``FAKE_CSV_SHARD_ROWS``, each
+    generated by its own Faker seeded from ``seed`` and the shard index.
+    Datasets with more than one shard are generated by a pool of
+    ``FAKE_CSV_PARALLEL_WORKERS`` processes and joined in order, so a
+    seeded run produces the same file whatever the number of workers.
+    Schemas with unique columns are generated in a single process, as
+    every shard must skip the values drawn by the shards before it.
+
+    With ``on_checkpoint``, the file is synced to disk after the header
+    and every shard, and ``on_checkpoint`` is called with a checkpoint
+    dict: the file path relative to ``MEDIA_ROOT``, the seed, and the
+    shards, rows and bytes committed so far. As a shard's Faker is seeded
+    from the seed and the shard index alone, that is all the random state
+    needed to continue. Passing the dict back as ``checkpoint`` truncates
+    the file to the committed bytes and generates the remaining shards,
+    producing the same file as an uninterrupted run; the values of unique
+    columns are first read back from the committed rows. A checkpointed file
+    is kept when generation fails, for the caller to resume or remove,
+    unless a callback raised ``Cancelled``. Checkpoints require
+    uncompressed output.
+
+    With ``pooled`` (``FAKE_CSV_POOLED`` by default), columns of the types
+    in ``pools.POOLED_TYPES`` sample pre-generated values instead of
+    calling Faker for every cell. Values are generated in ``locale``
+    (the schema's locale by default) by Fakers from the process pool.
+
+    ``compression`` is one of ``compression.EXTENSIONS``; the output is
+    compressed as it is written, without a second pass over the file.
+    """
+    if on_checkpoint is not None and compression:
+        raise ValueError("Compressed output cannot be checkpointed.")
+    if checkpoint is not None and not can_resume(checkpoint):
+        checkpoint = None
+    config = shard_config(schema, pooled, locale, rows)
+    if checkpoint is not None:
+        seed = checkpoint["seed"]
+    elif seed is None:
+        seed = random.getrandbits(64)
+    shards = list(iter_shards(rows, settings.FAKE_CSV_SHARD_ROWS))
+    if checkpoint is not None:
+        shards = shards[checkpoint["shards"] :]
+        filepath = os.path.join(settings.MEDIA_ROOT, checkpoint["path"])
+    else:
+        filepath = new_filepath(EXTENSIONS[compression])
+    workers = min(settings.FAKE_CSV_PARALLEL_WORKERS, len(shards))
+    if config.filters:
+        workers = 1
+
+    part_paths = [f"{filepath}.part{index}" for index, _ in shards]
+    profile_every = max(settings.FAKE_CSV_PROFILE_EVERY, 1)
+    profiler = None
+    if profile is not None:
+        profiler = Profiler(config.plan, config.pools, profile_every)
+
+    if stats is not None:
+        tracemalloc.start()
+    try:
+        with open(
+            filepath,
+            "wb" if checkpoint is None else "r+b",
+            buffering=settings.FAKE_CSV_WRITE_BUFFER,
+        ) as rawfile, open_output(
+            rawfile, compression, f"{slugify(schema.name) or 'dataset'}.csv"
+        ) as csvfile:
+            write = chunk_writer(csvfile, config)
+            commit = None
+            if on_checkpoint is not None:
+
+                def commit(shards_done, rows_done):
+                    csvfile.flush()
+                    rawfile.flush()
+                    os.fsync(rawfile.fileno())
+                    on_checkpoint(
+                        {
+                            "path": os.path.relpath(filepath, settings.MEDIA_ROOT),
+                            "seed": seed,
+                            "shards": shards_done,
+                            "rows": rows_done,
+                            "offset": rawfile.tell(),
+                        }
+                    )
+
+            if checkpoint is None:
+                csv.writer(csvfile, **config.dialect).writerow(config.plan.fieldnames)
+                rows_done = 0
+                if commit is not None:
+                    commit(0, 0)
+            else:
+                rawfile.truncate(checkpoint["offset"])
+                if config.filters:
+                    refill_from(filepath, config)
+                rawfile.seek(checkpoint["offset"])
+                rows_done = checkpoint["rows"]
+            report = None
+            if on_chunk is not None:
+
+                def report(rows_done):
+                    on_chunk(rows_done, rawfile.tell())
+
+            if workers > 1:
+                with ProcessPoolExecutor(workers) as pool:
+                    parts = pool.map(
+                        generate_part,
+                        part_paths,
+                        repeat(config),
+                        [shard_rows for _, shard_rows in shards],
+                        [shard_seed(seed, index) for index, _ in shards],
+                        repeat(profile_every if profiler else 0),
+                    )
+                    try:
+                        for (index, shard_rows), (part_path, summary) in zip(
+                            shards, parts
+                        ):
+                            if profiler is not None:
+                                profiler.merge(summary)
+                            with open(part_path, encoding="utf-8", newline="") as part:
+                                shutil.copyfileobj(part, csvfile)
+                            os.remove(part_path)
+                            rows_done += shard_rows
+                            if report is not None:
+                                report(rows_done)
+                            if commit is not None:
+                                commit(index + 1, rows_done)
+                    except BaseException:
+                        # Drop the shards no process has started on yet
+                        pool.shutdown(cancel_futures=True)
+                        raise
+            else:
+                for index, shard_rows in shards:
+                    rows_done = write_shard(
+                        write,
+                        config,
+                        shard_rows,
+                        shard_seed(seed, index),
+                        report,
+                        rows_done,
+                        profiler,
+                    )
+                    if commit is not None:
+                        commit(index + 1, rows_done)
+    except BaseException as error:
+        doomed = [filepath, *part_paths]
+        if on_checkpoint is not None and not isinstance(error, Cancelled):
+            doomed = part_paths
+        for path in doomed:
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        if stats is not None:
+            stats["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
 
+    if profiler is not None:
+        profile.update(profiler.summary())
     return filepath
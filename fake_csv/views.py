@@ -1,18 +1,85 @@
+import json
+import os
 from datetime import datetime
 
+from django.conf import settings
+
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction
-from django.forms import modelformset_factory
-from django.http import JsonResponse, HttpResponse
-from django.shortcuts import get_object_or_404
-from django.urls import reverse_lazy
+from django.db.models import prefetch_related_objects
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.shortcuts import get_object_or_404, render
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.views import View
 from django.views.generic import CreateView, UpdateView, ListView, DetailView
+from slugify import slugify
 
-from .forms import SchemasForm, SchemasColumnForm, DataschemaForm
+from .forms import ColumnFormSet, SchemasForm, DataschemaForm
 from .models import Column, DataSchema, DataSet
 
-from .utils import generate_csv
+from .columnar import CONTENT_TYPES as COLUMNAR_CONTENT_TYPES
+from .compiler import get_plan, invalidate_plan, unsupported_types
+from .compression import CONTENT_TYPES, EXTENSIONS, iter_compressed
+from .downloads import download_filename, serve_file
+from .jobs import cancel, reserve_stream, restart
+from .pagination import paginate_keyset
+from .preview import MAX_PREVIEW_ROWS, get_preview
+from .unique import UniqueExhausted, check_capacity
+from .utils import iter_csv
+
+
+def save_columns(schema, formset):
+    """
+    Save the columns of a valid ``formset`` to ``schema`` in a fixed number
+    of queries.
+
+    Existing schema columns missing from the formset are deleted, and the
+    ``order`` of the rest is renumbered from 1 following the submitted
+    order, ties keeping their position in the form.
+    """
+    columns = []
+    for form in formset:
+        if form.instance.pk is None and not form.has_changed():
+            continue
+        column = form.save(commit=False)
+        column.schema = schema
+        columns.append(column)
+    columns.sort(key=lambda column: column.order)
+    for order, column in enumerate(columns, 1):
+        column.order = order
+    existing = [column for column in columns if column.pk is not None]
+    schema.columns.exclude(pk__in=[column.pk for column in existing]).delete()
+    Column.objects.bulk_create([column for column in columns if column.pk is None])
+    Column.objects.bulk_update(
+        existing, ["name", "data_type", "range_from", "range_to", "unique", "order"]
+    )
+
+
+def check_locale(form, formset):
+    """
+    Add an error to the schema ``form`` when its locale cannot generate a
+    column type of the valid ``formset``, and return whether it can.
+    """
+    locale = form.cleaned_data["locale"]
+    data_types = {
+        column_form.cleaned_data["data_type"]
+        for column_form in formset
+        if column_form.cleaned_data.get("data_type")
+    }
+    unsupported = unsupported_types(locale, sorted(data_types))
+    if unsupported:
+        form.add_error(
+            "locale",
+            f"Locale {locale!r} cannot generate {', '.join(unsupported)} columns.",
+        )
+    return not unsupported
 
 
 class CreateSchemaView(LoginRequiredMixin, CreateView):
@@ -23,27 +90,24 @@ class CreateSchemaView(LoginRequiredMixin, CreateView):
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
         if self.request.POST:
-            data["formset"] = modelformset_factory(
-                Column, form=SchemasColumnForm, extra=0
-            )(self.request.POST)
+            data["formset"] = ColumnFormSet(
+                self.request.POST, queryset=Column.objects.none()
+            )
         else:
-            data["formset"] = modelformset_factory(
-                Column, form=SchemasColumnForm, extra=0
-            )()
+            data["formset"] = ColumnFormSet(queryset=Column.objects.none())
         return data
 
     def form_valid(self, form):
         context = self.get_context_data()
         formset = context["formset"]
-        if all([formset.is_valid(), form.is_valid()]):
-            self.object = form.save(commit=False)
-            self.object.user = self.request.user
-            self.object.save()
-            for form in formset:
-                child = form.save(commit=False)
-                child.schema = self.object
-                child.save()
-            return super().form_valid(form)
+        if all([formset.is_valid(), form.is_valid()]) and check_locale(form, formset):
+            with transaction.atomic():
+                self.object = form.save(commit=False)
+                self.object.user = self.request.user
+                self.object.save()
+                save_columns(self.object, formset)
+                invalidate_plan(self.object)
+            return HttpResponseRedirect(self.get_success_url())
         else:
             return self.render_to_response(self.get_context_data(form=form))
 
@@ -61,13 +125,11 @@ class UpdateSchemaView(LoginRequiredMixin, UpdateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         if self.request.POST:
-            context["formset"] = modelformset_factory(
-                Column, form=SchemasColumnForm, extra=0
-            )(self.request.POST, queryset=self.object.columns.all())
+            context["formset"] = ColumnFormSet(
+                self.request.POST, queryset=self.object.columns.all()
+            )
         else:
-            context["formset"] = modelformset_factory(
-                Column, form=SchemasColumnForm, extra=0
-            )(queryset=self.object.columns.all())
+            context["formset"] = ColumnFormSet(queryset=self.object.columns.all())
             columns = self.object.columns.all()
             context["columns"] = [i for i in columns]
             context["nested"] = zip(context["formset"], context["columns"])
@@ -76,14 +138,12 @@ class UpdateSchemaView(LoginRequiredMixin, UpdateView):
     def form_valid(self, form):
         context = self.get_context_data()
         formset = context["formset"]
-        if formset.is_valid():
-            self.object = form.save(commit=False)
-            self.object.save()
-            for form in formset:
-                child = form.save(commit=False)
-                child.schema = self.object
-                child.save()
-            return super().form_valid(form)
+        if formset.is_valid() and check_locale(form, formset):
+            with transaction.atomic():
+                self.object = form.save()
+                save_columns(self.object, formset)
+                invalidate_plan(self.object)
+            return HttpResponseRedirect(self.get_success_url())
         else:
             return self.render_to_response(self.get_context_data(form=form))
 
@@ -92,6 +152,7 @@ class DeleteColumnView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
         column = Column.objects.get(pk=pk)
         column.delete()
+        invalidate_plan(column.schema)
         return HttpResponse(status=200)
 
 
@@ -103,7 +164,17 @@ class SchemasListView(LoginRequiredMixin, ListView):
     paginate_by = 5
 
     def get_queryset(self):
-        return self.model.objects.filter(user=self.request.user.id)
+        return self.model.objects.filter(user=self.request.user.id).with_counts()
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginate_keyset(
+            queryset,
+            self.request.GET,
+            page_size,
+            descending=True,
+            cache_key=f"schemas:{self.request.user.id}",
+        )
+        return None, page, page.object_list, page.has_other_pages
 
 
 class DeleteSchemaView(LoginRequiredMixin, View):
@@ -118,13 +189,22 @@ class DatasetView(LoginRequiredMixin, DetailView):
     context_object_name = "schema"
     form_class = DataschemaForm
     template_name = "fake_csv/data_sets/dataset_detail.html"
+    paginate_by = 20
 
     def get_queryset(self):
         return self.model.objects.filter(user=self.request.user.id)
 
     def get_context_data(self, **kwargs):
+        prefetch_related_objects([self.object], "columns")
         context = super().get_context_data(**kwargs)
-        context["form"] = self.form_class()
+        context.setdefault("form", self.form_class())
+        context["poll_interval"] = round(settings.FAKE_CSV_PROGRESS_INTERVAL * 1000)
+        context["datasets"] = paginate_keyset(
+            self.object.datasets.defer("profile", "checkpoint"),
+            self.request.GET,
+            self.paginate_by,
+            cache_key=f"datasets:{self.object.pk}",
+        )
         return context
 
     def get(self, request, *args, **kwargs):
@@ -134,11 +214,9 @@ class DatasetView(LoginRequiredMixin, DetailView):
 
     def post(self, request, *args, **kwargs):
         self.object = self.get_object()
-        form = self.form_class(request.POST)
+        form = self.form_class(request.POST, instance=DataSet(schema=self.object))
         if form.is_valid():
-            dataset = form.save(commit=False)
-            dataset.schema = self.object
-            dataset.save()
+            dataset = form.save()
             created_at = datetime.fromisoformat(str(dataset.created_at))
             return JsonResponse(
                 {
@@ -157,17 +235,184 @@ class DatasetView(LoginRequiredMixin, DetailView):
 
 class GenerateFileView(LoginRequiredMixin, View):
     def post(self, request, pk, *args, **kwargs):
-        dataset = DataSet.objects.get(pk=pk)
-        with transaction.atomic():
-            dataset.file = generate_csv(
-                DataSchema.objects.get(pk=dataset.schema.pk), dataset.rows
-            )
-            dataset.status = "READY"
-            dataset.save()
+        dataset = get_object_or_404(DataSet, pk=pk, schema__user=request.user)
+        restarted = restart(dataset)
+        return JsonResponse(dataset_state(dataset), status=200 if restarted else 409)
+
+
+class CancelDatasetView(LoginRequiredMixin, View):
+    def post(self, request, pk, *args, **kwargs):
+        dataset = get_object_or_404(
+            DataSet.objects.select_related("job"), pk=pk, schema__user=request.user
+        )
+        cancelled = cancel(dataset)
+        return JsonResponse(dataset_state(dataset), status=200 if cancelled else 409)
+
+
+def status_detail(dataset):
+    """
+    Explain why ``dataset`` was rejected or failed, or when a deferred one
+    starts. Failures are only explained by one-line errors meant for users,
+    never by tracebacks.
+    """
+    job = getattr(dataset, "job", None)
+    if job is None:
+        return ""
+    if dataset.status == DataSet.REJECTED:
+        return job.error
+    if dataset.status == DataSet.FAILED and "\n" not in job.error:
+        return job.error
+    if dataset.status == DataSet.DEFERRED:
+        return f"Starts at {timezone.localtime(job.scheduled_at):%H:%M} (row quota)"
+    return ""
+
+
+def download_url(dataset):
+    if not dataset.file:
+        return None
+    return reverse("schemas:dataset-download", kwargs={"pk": dataset.pk})
+
+
+def dataset_state(dataset):
+    return {
+        "id": dataset.pk,
+        "status": dataset.status,
+        "detail": status_detail(dataset),
+        "file_url": download_url(dataset),
+        "progress": dataset.progress(),
+    }
+
+
+class DatasetStatusView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        dataset = get_object_or_404(
+            DataSet.objects.select_related("job"), pk=pk, schema__user=request.user
+        )
+        return JsonResponse(dataset_state(dataset))
+
+
+def watched_datasets(user, ids):
+    """The datasets of ``user`` among ``ids``, ignoring ids that are not numbers."""
+    return DataSet.objects.select_related("job").filter(
+        pk__in=[pk for pk in ids if pk.isdigit()], schema__user=user
+    )
+
+
+class DatasetStatusesView(LoginRequiredMixin, View):
+    """
+    The states of the datasets given as ``ids=1,2,3``, so a page watching
+    several datasets polls them all in one request.
+    """
+
+    def get(self, request, *args, **kwargs):
+        datasets = watched_datasets(request.user, request.GET.get("ids", "").split(","))
         return JsonResponse(
-            {
-                "id": dataset.pk,
-                "status": dataset.status,
-                "file_url": dataset.file.url
-            }
+            {"datasets": [dataset_state(dataset) for dataset in datasets]}
+        )
+
+
+class DatasetEventsView(LoginRequiredMixin, View):
+    """
+    Server-sent events with the state of the datasets given as ``id``.
+
+    Each request sends the current state of every dataset and ends at once,
+    so no worker is held between updates, and the ``retry`` field has the
+    browser reconnect after ``FAKE_CSV_PROGRESS_INTERVAL`` seconds. The
+    dataset page itself polls ``DatasetStatusesView``.
+    """
+
+    def get(self, request, *args, **kwargs):
+        datasets = watched_datasets(request.user, request.GET.getlist("id"))
+        interval = round(settings.FAKE_CSV_PROGRESS_INTERVAL * 1000)
+        events = [f"retry: {interval}\n\n"]
+        events += [
+            f"data: {json.dumps(dataset_state(dataset))}\n\n" for dataset in datasets
+        ]
+        response = HttpResponse("".join(events), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        return response
+
+
+class DownloadDatasetView(LoginRequiredMixin, View):
+    """
+    The generated file of a dataset, for its owner only, with support for
+    byte ranges and conditional requests.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        dataset = get_object_or_404(
+            DataSet.objects.select_related("schema"), pk=pk, schema__user=request.user
+        )
+        path = dataset.file and os.path.join(settings.MEDIA_ROOT, dataset.file.name)
+        if not path or not os.path.exists(path):
+            raise Http404("The dataset has no file.")
+        return serve_file(
+            request,
+            path,
+            download_filename(dataset),
+            COLUMNAR_CONTENT_TYPES.get(dataset.schema.file_format),
         )
+
+
+class StreamDatasetView(LoginRequiredMixin, View):
+    def get(self, request, pk, *args, **kwargs):
+        schema = get_object_or_404(DataSchema, pk=pk, user=request.user)
+        form = DataschemaForm(request.GET)
+        if not form.is_valid():
+            return JsonResponse(form.errors, status=400)
+        rows = form.cleaned_data["rows"]
+        if rows > settings.FAKE_CSV_STREAM_MAX_ROWS:
+            return JsonResponse(
+                {
+                    "rows": [
+                        f"Streams are limited to {settings.FAKE_CSV_STREAM_MAX_ROWS} "
+                        f"rows; generate larger datasets instead."
+                    ]
+                },
+                status=429,
+            )
+        try:
+            # Checked up front, as the response has begun once a column runs out
+            check_capacity(get_plan(schema), rows)
+        except UniqueExhausted as error:
+            return JsonResponse({"rows": [str(error)]}, status=400)
+        if not reserve_stream(request.user, rows):
+            return JsonResponse(
+                {"rows": ["The hourly row quota has no room for this stream."]},
+                status=429,
+            )
+        name = slugify(schema.name) or "dataset"
+        compression = form.cleaned_data["compression"]
+        chunks = iter_csv(schema, rows, form.cleaned_data["seed"])
+        if compression:
+            chunks = iter_compressed(chunks, compression, f"{name}.csv")
+        response = StreamingHttpResponse(
+            chunks, content_type=CONTENT_TYPES[compression]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="{name}.{EXTENSIONS[compression]}"'
+        )
+        return response
+
+
+class PreviewDatasetView(LoginRequiredMixin, View):
+    """
+    The first ``rows`` rows of a schema's data as JSON, or as an HTML table
+    with ``format=html``, generated in memory and cached per schema version.
+    """
+
+    def get(self, request, pk, *args, **kwargs):
+        schema = get_object_or_404(DataSchema, pk=pk, user=request.user)
+        rows = request.GET.get("rows", str(settings.FAKE_CSV_PREVIEW_ROWS))
+        if not rows.isdigit() or not 1 <= int(rows) <= MAX_PREVIEW_ROWS:
+            return JsonResponse(
+                {"rows": [f"Enter a number from 1 to {MAX_PREVIEW_ROWS}."]},
+                status=400,
+            )
+        try:
+            preview = get_preview(schema, int(rows))
+        except UniqueExhausted as error:
+            return JsonResponse({"rows": [str(error)]}, status=400)
+        if request.GET.get("format") == "html":
+            return render(request, "fake_csv/data_sets/preview.html", preview)
+        return JsonResponse(preview)
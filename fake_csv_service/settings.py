@@ -132,3 +132,116 @@ MEDIA_ROOT = BASE_DIR / "media"
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Dataset generation
+
+# Number of rows generated and written to the CSV file at a time
+FAKE_CSV_CHUNK_SIZE = int(os.environ.get("FAKE_CSV_CHUNK_SIZE", 10000))
+
+# Number of processes started by "manage.py generation_worker"
+FAKE_CSV_WORKERS = int(os.environ.get("FAKE_CSV_WORKERS", 2))
+
+# Seconds a worker owns a claimed job before another worker may take it over
+FAKE_CSV_JOB_LEASE_SECONDS = int(os.environ.get("FAKE_CSV_JOB_LEASE_SECONDS", 300))
+
+# Seconds an idle worker waits before polling the queue again
+FAKE_CSV_JOB_POLL_INTERVAL = float(os.environ.get("FAKE_CSV_JOB_POLL_INTERVAL", 1))
+
+# Number of times a job is attempted before it is marked as failed
+FAKE_CSV_JOB_MAX_ATTEMPTS = int(os.environ.get("FAKE_CSV_JOB_MAX_ATTEMPTS", 3))
+
+# Number of rows in each independently seeded shard of a dataset
+FAKE_CSV_SHARD_ROWS = int(os.environ.get("FAKE_CSV_SHARD_ROWS", 100000))
+
+# Number of processes generating the shards of one large dataset in parallel
+FAKE_CSV_PARALLEL_WORKERS = int(
+    os.environ.get("FAKE_CSV_PARALLEL_WORKERS", os.cpu_count() or 1)
+)
+
+# Locale used by Faker when generating datasets
+FAKE_CSV_LOCALE = os.environ.get("FAKE_CSV_LOCALE", "en_US")
+
+# Sample names, jobs, emails, etc. from pre-generated value pools instead of
+# calling Faker for every cell
+FAKE_CSV_POOLED = bool(int(os.environ.get("FAKE_CSV_POOLED", 0)))
+
+# Directory holding the memory-mapped value pools
+FAKE_CSV_POOL_DIR = BASE_DIR / "pools"
+
+# Number of values in each pool
+FAKE_CSV_POOL_SIZE = int(os.environ.get("FAKE_CSV_POOL_SIZE", 100000))
+
+# Number of pools kept memory-mapped per process
+FAKE_CSV_POOL_MAX_RESIDENT = int(os.environ.get("FAKE_CSV_POOL_MAX_RESIDENT", 8))
+
+# Directory of the seeded dataset cache; it must be on the same file system as
+# MEDIA_ROOT for cached files to be shared through hard links
+FAKE_CSV_CACHE_DIR = MEDIA_ROOT / "cache"
+
+# Total size in bytes and age in seconds after which cache entries are evicted
+FAKE_CSV_CACHE_MAX_BYTES = int(
+    os.environ.get("FAKE_CSV_CACHE_MAX_BYTES", 10 * 1024 * 1024 * 1024)
+)
+FAKE_CSV_CACHE_MAX_AGE = int(os.environ.get("FAKE_CSV_CACHE_MAX_AGE", 7 * 24 * 3600))
+
+# Compression level used by each codec a dataset can be compressed with
+FAKE_CSV_COMPRESSION_LEVELS = {
+    "gzip": int(os.environ.get("FAKE_CSV_GZIP_LEVEL", 6)),
+    "zip": int(os.environ.get("FAKE_CSV_ZIP_LEVEL", 6)),
+    "zstd": int(os.environ.get("FAKE_CSV_ZSTD_LEVEL", 3)),
+}
+
+# Seconds between progress updates of a running dataset, and between the
+# polls of pages watching it
+FAKE_CSV_PROGRESS_INTERVAL = float(os.environ.get("FAKE_CSV_PROGRESS_INTERVAL", 1))
+
+# Profile one generated chunk in this many, storing per-column timings with
+# the dataset; 0 disables profiling
+FAKE_CSV_PROFILE_EVERY = int(os.environ.get("FAKE_CSV_PROFILE_EVERY", 20))
+
+# Seconds the approximate totals shown by paginated lists are cached for;
+# 0 hides them and skips counting altogether
+FAKE_CSV_PAGE_TOTAL_TTL = int(os.environ.get("FAKE_CSV_PAGE_TOTAL_TTL", 60))
+
+# Jobs of one user that may run at the same time; 0 means no limit
+FAKE_CSV_USER_MAX_RUNNING = int(os.environ.get("FAKE_CSV_USER_MAX_RUNNING", 2))
+
+# Rows one user may schedule per hour; larger requests are deferred, and
+# requests larger than the whole quota rejected. 0 means no quota
+FAKE_CSV_USER_ROWS_PER_HOUR = int(
+    os.environ.get("FAKE_CSV_USER_ROWS_PER_HOUR", 10000000)
+)
+
+# Seconds of waiting that offset one second of expected generation time when
+# ordering jobs; higher values let small jobs overtake more
+FAKE_CSV_SCHEDULER_COST_WEIGHT = float(
+    os.environ.get("FAKE_CSV_SCHEDULER_COST_WEIGHT", 1)
+)
+
+# Bytes buffered before generated files are written to disk
+FAKE_CSV_WRITE_BUFFER = int(os.environ.get("FAKE_CSV_WRITE_BUFFER", 1024 * 1024))
+
+# Rows shown by schema previews by default, and seconds a preview is cached
+# for; editing a schema invalidates its previews
+FAKE_CSV_PREVIEW_ROWS = int(os.environ.get("FAKE_CSV_PREVIEW_ROWS", 20))
+FAKE_CSV_PREVIEW_TTL = int(os.environ.get("FAKE_CSV_PREVIEW_TTL", 3600))
+
+# Unique columns remember up to this many values exactly; larger datasets use
+# a Bloom filter with the given false positive rate, which costs a redraw
+FAKE_CSV_UNIQUE_EXACT_LIMIT = int(
+    os.environ.get("FAKE_CSV_UNIQUE_EXACT_LIMIT", 1000000)
+)
+FAKE_CSV_UNIQUE_ERROR_RATE = float(os.environ.get("FAKE_CSV_UNIQUE_ERROR_RATE", 0.001))
+
+# Draws per value a unique column makes before giving up as exhausted
+FAKE_CSV_UNIQUE_MAX_TRIES = int(os.environ.get("FAKE_CSV_UNIQUE_MAX_TRIES", 100))
+
+# Hand downloads off to a front proxy instead of sending them from Django:
+# "X-Accel-Redirect" for nginx, with FAKE_CSV_SENDFILE_PREFIX the internal
+# location aliased to MEDIA_ROOT, or "X-Sendfile" for Apache and lighttpd
+FAKE_CSV_SENDFILE_HEADER = os.environ.get("FAKE_CSV_SENDFILE_HEADER", "")
+FAKE_CSV_SENDFILE_PREFIX = os.environ.get("FAKE_CSV_SENDFILE_PREFIX", "/protected/")
+
+# Rows a direct download may stream at most; streams also count against
+# FAKE_CSV_USER_ROWS_PER_HOUR and are refused when it has no room left
+FAKE_CSV_STREAM_MAX_ROWS = int(os.environ.get("FAKE_CSV_STREAM_MAX_ROWS", 1000000))